@@ -16,10 +16,37 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)  # Load configuration from config.py
 
+    from app.logs import init_logging
+    init_logging(app)
+
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
 
+    from app.storage import init_storage
+    init_storage(app)
+
+    from app.qr_engine import init_qr_engine
+    init_qr_engine(app)
+
+    from app.email_utils import init_email_templates
+    init_email_templates(app)
+
+    from app.entitlements import init_entitlements
+    init_entitlements(app)
+
+    from app.template_registry import init_template_registry
+    init_template_registry(app)
+
+    from app.render_resources import init_render_resources
+    init_render_resources(app)
+
+    from app.render_service import init_render_service
+    init_render_service(app)
+
+    from app.admission import init_render_admission
+    init_render_admission(app)
+
     # Import and register your blueprints
     from app.auth import auth_bp
     from app.routes import main_bp
@@ -27,6 +54,7 @@ def create_app():
     from app.admin import admin_bp  # Import admin blueprint
     from app.bulk_certificates import bulk_bp  # Import bulk certificates blueprint
     from app.analytics import analytics_bp  # Import analytics blueprint
+    from app.downloads import downloads_bp, file_url  # Import signed downloads blueprint
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -34,6 +62,8 @@ def create_app():
     app.register_blueprint(admin_bp)  # Register admin blueprint
     app.register_blueprint(bulk_bp)  # Register bulk certificates blueprint
     app.register_blueprint(analytics_bp)  # Register analytics blueprint
+    app.register_blueprint(downloads_bp)  # Register signed downloads blueprint
+    app.add_template_global(file_url)
 
     # Initialize security features
     from app.security import init_security, handle_errors, generate_error_templates, apply_rate_limits
@@ -1,11 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, abort
 from flask_login import login_required, current_user, login_user, logout_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from app.models import User, Invoice, QRCode, Resume, Certificate, Subscription, AdminUser, db
+from app.models import User, Invoice, QRCode, Resume, Certificate, Subscription, AdminUser, PlanDefinition, db
 from app import login_manager
 from datetime import datetime, timedelta
-import os
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, or_
+from app.documents import FILE_TYPES, query_documents, delete_user_documents, is_path_referenced
+from app.storage import get_storage
+from app.security_events import flush_security_events, query_events, summarize_events
+from app.security import check_suspicious_activity, record_failed_login, record_successful_login
+from app.entitlements import get_plans, parse_plan_form, save_plan, reset_plan
+from app.render_jobs import render_metrics
+import hmac
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -20,12 +26,20 @@ def admin_login():
         email = request.form.get('email')
         password = request.form.get('password')
         
+        locked_for = check_suspicious_activity(None, request.remote_addr, email)
+        if locked_for:
+            flash('Too many failed login attempts. Please try again later.', 'danger')
+            return render_template('admin/login.html'), 429, {'Retry-After': str(locked_for)}
+        
         admin = AdminUser.query.filter_by(email=email).first()
         if admin and check_password_hash(admin.password, password):
+            record_successful_login(request.remote_addr, email)
             login_user(admin)
             flash('Admin login successful!', 'success')
             return redirect(url_for('admin.dashboard'))
         else:
+            record_failed_login(request.remote_addr, email, admin.id if admin else None,
+                                event_type='admin_login_failed')
             flash('Invalid admin credentials!', 'danger')
     
     return render_template('admin/login.html')
@@ -141,23 +155,28 @@ def delete_user(user_id):
     
     user = User.query.get_or_404(user_id)
     
-    # Delete user's files
-    for invoice in user.invoices:
-        if invoice.pdf_path and os.path.exists(invoice.pdf_path):
-            os.remove(invoice.pdf_path)
-    
-    for resume in user.resumes:
-        if resume.pdf_path and os.path.exists(resume.pdf_path):
-            os.remove(resume.pdf_path)
-    
-    for certificate in user.certificates:
-        if certificate.pdf_path and os.path.exists(certificate.pdf_path):
-            os.remove(certificate.pdf_path)
+    # Collect the user's stored files before the rows go away
+    paths = [invoice.pdf_path for invoice in user.invoices]
+    paths += [resume.pdf_path for resume in user.resumes]
+    paths += [certificate.pdf_path for certificate in user.certificates]
+    paths += [qr.img_path for qr in user.qrcodes]
     
     # Delete user and related data
+    delete_user_documents(user.id)
+    for record in user.invoices + user.resumes + user.certificates + user.qrcodes:
+        db.session.delete(record)
+    if user.subscription:
+        db.session.delete(user.subscription)
     db.session.delete(user)
     db.session.commit()
     
+    # Stored files are shared by identical documents, so only remove
+    # the ones no other document still references
+    storage = get_storage()
+    for path in set(filter(None, paths)):
+        if not is_path_referenced(path):
+            storage.delete(path)
+    
     flash(f'User {user.username} and all their data have been deleted!', 'success')
     return redirect(url_for('admin.users'))
 
@@ -169,21 +188,39 @@ def files():
         return redirect(url_for('main.index'))
     
     file_type = request.args.get('type', 'all')
-    page = request.args.get('page', 1, type=int)
-    
-    if file_type == 'invoices':
-        files = Invoice.query.paginate(page=page, per_page=20, error_out=False)
-    elif file_type == 'resumes':
-        files = Resume.query.paginate(page=page, per_page=20, error_out=False)
-    elif file_type == 'certificates':
-        files = Certificate.query.paginate(page=page, per_page=20, error_out=False)
-    elif file_type == 'qrcodes':
-        files = QRCode.query.paginate(page=page, per_page=20, error_out=False)
-    else:
-        # Show all files - this would need a more complex query
-        files = Invoice.query.paginate(page=page, per_page=20, error_out=False)
-    
-    return render_template('admin/files.html', files=files, file_type=file_type)
+    if file_type not in FILE_TYPES:
+        file_type = 'all'
+
+    # Optional filters: user (id, username or email) and created date range
+    user_filter = request.args.get('user', '').strip()
+    user_id = None
+    if user_filter:
+        if user_filter.isdigit():
+            user_id = int(user_filter)
+        else:
+            match = User.query.filter(or_(User.email == user_filter, User.username == user_filter)).first()
+            user_id = match.id if match else -1
+
+    date_from = request.args.get('from', '').strip()
+    date_to = request.args.get('to', '').strip()
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'warning')
+        start = end = None
+
+    files = query_documents(
+        doc_type=FILE_TYPES.get(file_type),
+        user_id=user_id,
+        start=start,
+        end=end,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
+
+    filters = {k: v for k, v in (('user', user_filter), ('from', date_from), ('to', date_to)) if v}
+    return render_template('admin/files.html', files=files, file_type=file_type, filters=filters)
 
 @admin_bp.route('/admin/subscriptions')
 @login_required
@@ -196,6 +233,53 @@ def subscriptions():
     subscriptions = Subscription.query.paginate(page=page, per_page=20, error_out=False)
     return render_template('admin/subscriptions.html', subscriptions=subscriptions)
 
+@admin_bp.route('/admin/security')
+@login_required
+def security():
+    if not hasattr(current_user, 'is_super_admin'):
+        flash('Access denied! Admin access required.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    # Make events from the last couple of seconds visible too
+    flush_security_events()
+    
+    event_type = request.args.get('type', '').strip()
+    ip_address = request.args.get('ip', '').strip()
+    user_id = request.args.get('user_id', type=int)
+    hours = request.args.get('hours', 24, type=int)
+    before_id = request.args.get('before', type=int)
+    since = datetime.utcnow() - timedelta(hours=hours)
+    
+    events = query_events(event_type or None, ip_address or None, user_id, since, before_id, limit=100)
+    summary = summarize_events(since)
+    filters = {k: v for k, v in {'type': event_type, 'ip': ip_address, 'user_id': user_id, 'hours': hours}.items() if v}
+    
+    return render_template('admin/security.html', events=events, summary=summary, filters=filters,
+                           next_before=events[-1].id if len(events) == 100 else None)
+
+@admin_bp.route('/admin/plans', methods=['GET', 'POST'])
+@login_required
+def plans():
+    if not hasattr(current_user, 'is_super_admin') or not current_user.is_super_admin:
+        flash('Access denied! Super admin access required.', 'danger')
+        return redirect(url_for('admin.dashboard'))
+    
+    if request.method == 'POST':
+        name = request.form.get('plan')
+        try:
+            if request.form.get('action') == 'reset':
+                reset_plan(name)
+                flash(f'{name.title()} plan reset to defaults.', 'success')
+            else:
+                save_plan(name, parse_plan_form(request.form))
+                flash(f'{name.title()} plan updated. All workers apply it within a few seconds.', 'success')
+        except ValueError as e:
+            flash(f'Could not update plan: {e}', 'danger')
+        return redirect(url_for('admin.plans'))
+    
+    edited = {row.name: row.updated_at for row in PlanDefinition.query.all()}
+    return render_template('admin/plans.html', plans=get_plans().values(), edited=edited)
+
 @admin_bp.route('/admin/settings')
 @login_required
 def settings():
@@ -205,6 +289,16 @@ def settings():
     
     return render_template('admin/settings.html')
 
+@admin_bp.route('/admin/metrics')
+def metrics():
+    """Render admission metrics of this worker process, for Prometheus to scrape"""
+    token = current_app.config.get('METRICS_TOKEN')
+    auth = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode())
+    if not scraper and not (current_user.is_authenticated and hasattr(current_user, 'is_super_admin')):
+        abort(403)
+    return Response(render_metrics(current_app), mimetype='text/plain; version=0.0.4')
+
 @admin_bp.route('/admin/create-admin', methods=['GET', 'POST'])
 @login_required
 def create_admin():
@@ -0,0 +1,155 @@
+"""
+Admission control for the render path
+
+A PDF render is CPU-bound and holds the GIL (or a render service worker)
+for its whole duration. Letting every request render at once only makes all
+of them slow, including pages that render nothing. The render gate bounds
+how many renders a web process runs at a time:
+
+    - at most RENDER_MAX_CONCURRENCY renders run concurrently
+    - up to RENDER_QUEUE_SIZE more requests wait for a slot, each for at
+      most RENDER_QUEUE_TIMEOUT seconds
+    - anything beyond that is shed at once with RenderBusy, which carries a
+      Retry-After estimate from the recent render times; the views then
+      defer the render (202 + polling URL) or answer 503 (app/render_jobs.py)
+    - deferred renders wait behind the web requests, so a backlog of
+      deferred work never delays an interactive one
+
+The counters are exported in Prometheus format on /admin/metrics. The gate
+is per process: with several web workers each one has its own.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+
+
+class RenderBusy(Exception):
+    """No render slot is free and the wait queue is full (or timed out)"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Render capacity exhausted, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderGate:
+    def __init__(self, max_concurrency=2, queue_size=8, queue_timeout=2.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0            # web requests waiting for a slot
+        self.waiting_deferred = 0   # deferred jobs waiting for a slot
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.render_seconds = 0.0
+        self.average_render = 1.0   # EWMA of render seconds, for Retry-After
+        self._cond = threading.Condition()
+
+    def _full(self):
+        return self.in_flight >= self.max_concurrency
+
+    def acquire(self, deferred=False):
+        """
+        Take a render slot; returns the monotonic time it was granted.
+        Web requests raise RenderBusy when they cannot get one within the
+        queue limits; deferred jobs wait as long as it takes.
+        """
+        with self._cond:
+            if not self._full() and not self.waiting and not (deferred and self.waiting_deferred):
+                return self._grant(0.0)
+            if deferred:
+                self.waiting_deferred += 1
+                started = time.monotonic()
+                try:
+                    while self._full() or self.waiting:
+                        self._cond.wait()
+                    return self._grant(time.monotonic() - started)
+                finally:
+                    self.waiting_deferred -= 1
+            if self.waiting >= self.queue_size:
+                self.rejected += 1
+                raise RenderBusy(self._retry_after())
+            self.waiting += 1
+            self.queued += 1
+            started = time.monotonic()
+            deadline = started + self.queue_timeout
+            try:
+                while self._full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        self.timed_out += 1
+                        raise RenderBusy(self._retry_after())
+                    self._cond.wait(remaining)
+                return self._grant(time.monotonic() - started)
+            finally:
+                self.waiting -= 1
+                # A deferred job may have been held back by this waiter
+                self._cond.notify_all()
+
+    def _grant(self, waited):
+        self.in_flight += 1
+        self.admitted += 1
+        self.wait_seconds += waited
+        return time.monotonic()
+
+    def release(self, granted_at):
+        elapsed = time.monotonic() - granted_at
+        with self._cond:
+            self.in_flight -= 1
+            self.completed += 1
+            self.render_seconds += elapsed
+            self.average_render = 0.8 * self.average_render + 0.2 * elapsed
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, deferred=False):
+        granted_at = self.acquire(deferred)
+        try:
+            yield
+        finally:
+            self.release(granted_at)
+
+    def _retry_after(self):
+        """Seconds until the work ahead of a new request has likely drained"""
+        ahead = self.in_flight + self.waiting + self.waiting_deferred + 1
+        return max(1, math.ceil(self.average_render * ahead / self.max_concurrency))
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'waiting_deferred': self.waiting_deferred,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'completed': self.completed,
+                'wait_seconds': self.wait_seconds,
+                'render_seconds': self.render_seconds,
+            }
+
+
+def init_render_admission(app):
+    gate = RenderGate(app.config.get('RENDER_MAX_CONCURRENCY', 2),
+                      app.config.get('RENDER_QUEUE_SIZE', 8),
+                      app.config.get('RENDER_QUEUE_TIMEOUT', 2.0))
+    app.extensions['render_gate'] = gate
+    return gate
+
+
+def get_render_gate():
+    return current_app.extensions['render_gate']
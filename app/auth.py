@@ -1,14 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, make_response
 from flask_login import login_user, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User
 from .forms import RegistrationForm, LoginForm
 from . import db
-from .email_utils import send_verification_email, send_welcome_email
+from .email_utils import send_verification_email, send_welcome_email, load_verification_token
+from itsdangerous import SignatureExpired
+from .security import check_suspicious_activity, record_failed_login, record_successful_login
 from datetime import datetime
+import logging
 
 auth_bp = Blueprint('auth', __name__)
 
+# Login/logout activity, also written to LOGIN_LOG_FILE (see app/logs.py)
+login_logger = logging.getLogger('app.login')
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -35,35 +41,53 @@ def login():
         return redirect(url_for('main.dashboard'))
     form = LoginForm()
     if form.validate_on_submit():
+        # Refuse locked-out clients/accounts before touching the database
+        locked_for = check_suspicious_activity(None, request.remote_addr, form.email.data)
+        if locked_for:
+            minutes = max(1, (locked_for + 59) // 60)
+            flash(f'Too many failed login attempts. Please try again in {minutes} minutes.', 'danger')
+            response = make_response(render_template('login.html', form=form), 429)
+            response.headers['Retry-After'] = str(locked_for)
+            return response
+
         user = User.query.filter_by(email=form.email.data).first()
         if user and check_password_hash(user.password, form.password.data):
+            record_successful_login(request.remote_addr, form.email.data)
             login_user(user)
             user.last_login = datetime.utcnow()
             db.session.commit()
 
             # Log successful login
-            print(f"USER LOGIN: {user.username} ({user.email}) logged in at {datetime.utcnow()}")
-            logging.info(f"Login: User {user.username} ({user.email}) - IP: {request.remote_addr}")
+            login_logger.info("Login: User %s (%s) - IP: %s", user.username, user.email, request.remote_addr,
+                              extra={'event_type': 'login', 'event': {
+                                  'user_id': user.id, 'username': user.username,
+                                  'email': user.email, 'ip_address': request.remote_addr}})
 
             return redirect(url_for('main.dashboard'))
         else:
             # Log failed login attempt
-            print(f"FAILED LOGIN: Attempted login with email {form.email.data} at {datetime.utcnow()}")
-            logging.warning(f"Failed login attempt: Email {form.email.data} - IP: {request.remote_addr}")
+            login_logger.warning("Failed login attempt: Email %s - IP: %s", form.email.data, request.remote_addr,
+                                 extra={'event_type': 'login_failed', 'event': {
+                                     'email': form.email.data, 'ip_address': request.remote_addr}})
+            record_failed_login(request.remote_addr, form.email.data, user.id if user else None)
             flash('Login failed. Check your email and password.', 'danger')
     return render_template('login.html', form=form)
 
 @auth_bp.route('/verify-email/<token>')
 def verify_email(token):
-    user = User.query.filter_by(verification_token=token).first()
+    try:
+        user = load_verification_token(token)
+    except SignatureExpired:
+        flash('Verification link has expired. Please request a new one.', 'danger')
+        return redirect(url_for('auth.login'))
     
     if not user:
         flash('Invalid or expired verification link.', 'danger')
         return redirect(url_for('auth.login'))
     
-    if user.token_expires and user.token_expires < datetime.utcnow():
-        flash('Verification link has expired. Please request a new one.', 'danger')
-        return redirect(url_for('auth.login'))
+    if user.is_verified:
+        flash('Your email is already verified.', 'info')
+        return redirect(url_for('main.dashboard'))
     
     user.is_verified = True
     user.verification_token = None
@@ -96,8 +120,11 @@ def resend_verification():
 def logout():
     if current_user.is_authenticated:
         # Log logout
-        print(f"USER LOGOUT: {current_user.username} ({current_user.email}) logged out at {datetime.utcnow()}")
-        logging.info(f"Logout: User {current_user.username} ({current_user.email}) - IP: {request.remote_addr}")
+        login_logger.info("Logout: User %s (%s) - IP: %s", current_user.username, current_user.email,
+                          request.remote_addr,
+                          extra={'event_type': 'logout', 'event': {
+                              'user_id': current_user.id, 'username': current_user.username,
+                              'email': current_user.email, 'ip_address': request.remote_addr}})
 
     logout_user()
     flash('You have been logged out.', 'info')
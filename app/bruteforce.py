@@ -0,0 +1,140 @@
+"""
+In-memory brute-force login detection
+
+Failed logins are counted per IP, per email address and per (IP, email)
+pair in sliding-window counters. Each key keeps a small ring of time
+buckets (BRUTE_FORCE_WINDOW split into BUCKETS slots), and each counter
+holds at most BRUTE_FORCE_MAX_KEYS keys, evicting the least recently
+touched, so memory stays bounded under a credential-stuffing flood.
+
+Going over a threshold locks the key out for BRUTE_FORCE_LOCKOUT seconds:
+
+    (IP, email)  BRUTE_FORCE_MAX_PER_PAIR   one client guessing one password
+    email        BRUTE_FORCE_MAX_PER_EMAIL  one account attacked from many IPs
+    IP           BRUTE_FORCE_MAX_PER_IP     one client trying many accounts
+
+Checks are dictionary lookups plus a sum over the ring, a few microseconds,
+and never touch the database. State is per process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+BUCKETS = 60
+
+
+class SlidingWindowCounter:
+    """Per-key event counts over the last ``window`` seconds"""
+
+    def __init__(self, window=900, buckets=BUCKETS, max_keys=100000):
+        self.width = max(1, window // buckets)
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self._rings = OrderedDict()  # key -> [counts, epochs]
+
+    def add(self, key, now=None):
+        epoch = int((now or time.time()) // self.width)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = [[0] * self.buckets, [0] * self.buckets]
+            if len(self._rings) > self.max_keys:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(key)
+        counts, epochs = ring
+        slot = epoch % self.buckets
+        if epochs[slot] != epoch:
+            counts[slot] = 0
+            epochs[slot] = epoch
+        counts[slot] += 1
+        return self._sum(counts, epochs, epoch)
+
+    def count(self, key, now=None):
+        ring = self._rings.get(key)
+        if ring is None:
+            return 0
+        return self._sum(ring[0], ring[1], int((now or time.time()) // self.width))
+
+    def _sum(self, counts, epochs, epoch):
+        oldest = epoch - self.buckets
+        return sum(c for c, e in zip(counts, epochs) if e > oldest)
+
+    def reset(self, key):
+        self._rings.pop(key, None)
+
+    def __len__(self):
+        return len(self._rings)
+
+
+class BruteForceDetector:
+    def __init__(self, window=900, max_per_pair=5, max_per_email=10, max_per_ip=30,
+                 lockout=900, max_keys=100000):
+        self.thresholds = {'pair': max_per_pair, 'email': max_per_email, 'ip': max_per_ip}
+        self.counters = {name: SlidingWindowCounter(window, max_keys=max_keys) for name in self.thresholds}
+        self.lockout = lockout
+        self.max_keys = max_keys
+        self._locked = OrderedDict()  # (kind, key) -> locked until
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(ip, email):
+        email = (email or '').strip().lower()
+        keys = {'ip': ip, 'email': email or None}
+        keys['pair'] = (ip, email) if ip and email else None
+        return keys
+
+    def retry_after(self, ip, email, now=None):
+        """Seconds until this attempt is allowed again, or 0 if it is allowed now"""
+        now = now or time.time()
+        wait = 0
+        with self._lock:
+            for kind, key in self._keys(ip, email).items():
+                if key is None:
+                    continue
+                until = self._locked.get((kind, key))
+                if until is None:
+                    continue
+                if until <= now:
+                    del self._locked[(kind, key)]
+                else:
+                    wait = max(wait, until - now)
+        return int(wait + 0.999)
+
+    def record_failure(self, ip, email, now=None):
+        """
+        Count a failed attempt. Returns the list of key kinds that just
+        crossed their threshold (and are now locked out).
+        """
+        now = now or time.time()
+        tripped = []
+        with self._lock:
+            for kind, key in self._keys(ip, email).items():
+                if key is None:
+                    continue
+                if self.counters[kind].add(key, now) >= self.thresholds[kind] \
+                        and (kind, key) not in self._locked:
+                    self._locked[(kind, key)] = now + self.lockout
+                    if len(self._locked) > self.max_keys:
+                        self._locked.popitem(last=False)
+                    tripped.append(kind)
+        return tripped
+
+    def record_success(self, ip, email):
+        """A correct password clears the counters tied to that account"""
+        keys = self._keys(ip, email)
+        with self._lock:
+            for kind in ('pair', 'email'):
+                if keys[kind] is not None:
+                    self.counters[kind].reset(keys[kind])
+
+
+def init_bruteforce(app):
+    app.extensions['bruteforce'] = BruteForceDetector(
+        window=app.config.get('BRUTE_FORCE_WINDOW', 900),
+        max_per_pair=app.config.get('BRUTE_FORCE_MAX_PER_PAIR', 5),
+        max_per_email=app.config.get('BRUTE_FORCE_MAX_PER_EMAIL', 10),
+        max_per_ip=app.config.get('BRUTE_FORCE_MAX_PER_IP', 30),
+        lockout=app.config.get('BRUTE_FORCE_LOCKOUT', 900),
+        max_keys=app.config.get('BRUTE_FORCE_MAX_KEYS', 100000)
+    )
+    return app.extensions['bruteforce']
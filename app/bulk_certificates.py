@@ -1,27 +1,46 @@
 """
-Bulk certificate generation with Excel upload
+Bulk certificate and QR code generation with Excel/CSV upload
+
+Bulk certificate files may include a ``recipient_email`` column. Each
+certificate with an address is queued in the email outbox with its PDF
+attached; the outbox worker pool delivers them and records per-recipient
+status, shown on the deliveries page.
 """
-from flask import Blueprint, render_template, request, flash, send_file, current_app, redirect, url_for
+from flask import Blueprint, render_template, request, flash, send_file, current_app, redirect, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 # import pandas as pd  # Commented out for now due to build issues
+import atexit
+import csv
+import io
+import multiprocessing
 import os
+import re
+import threading
+import uuid
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 from datetime import datetime
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.lib.units import inch
 from app.subscription_utils import can_use_bulk_operations, check_usage_limit
-from app.models import Certificate, db
+from app.models import Certificate, QRCode, EmailOutbox, db
+from app.documents import index_document
+from app.storage import get_storage
+from app.qr_engine import make_spec, encode_job, FORMATS
+from app.rendering import compiled_template, render_certificate
+from app.admission import RenderBusy, get_render_gate
+from app.email_utils import render_email
+from app.outbox import queue_email, campaign_status
 
 bulk_bp = Blueprint('bulk', __name__)
 
 ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
 
+_pool_lock = threading.Lock()
+
+EMAIL_RE = re.compile(r'^[^@\s,;]+@[^@\s,;]+\.[^@\s,;]+$')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -79,110 +98,90 @@ def bulk_certificates():
                         'issuer': str(row_data.get('issuer', '')),
                         'date_issued': str(row_data.get('date_issued', '')),
                         'signature_name': str(row_data.get('signature_name', '')),
-                        'signature_title': str(row_data.get('signature_title', ''))
+                        'signature_title': str(row_data.get('signature_title', '')),
+                        'recipient_email': str(row_data.get('recipient_email', ''))
                     }
+                    if certificate_data['recipient_email'] and not EMAIL_RE.match(certificate_data['recipient_email']):
+                        flash(f'Row {i+1} has an invalid recipient_email', 'error')
+                        return redirect(request.url)
                     certificates.append(certificate_data)
                 
                 # Check usage limit
-                can_create, message = check_usage_limit('certificate')
+                can_create, message = check_usage_limit('certificate', count=len(certificates))
                 if not can_create:
                     flash(f'Cannot create {len(certificates)} certificates: {message}', 'warning')
                     return redirect(request.url)
                 
                 # Create ZIP file with all certificates
+                storage = get_storage()
+                campaign = f"certs-{uuid.uuid4().hex[:16]}"
+                emailed = 0
                 zip_buffer = BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                    for i, cert_data in enumerate(certificates):
-                        # Generate PDF for each certificate
-                        pdf_buffer = BytesIO()
-                        page_size = landscape(A4)
-                        doc = SimpleDocTemplate(
-                            pdf_buffer,
-                            pagesize=page_size,
-                            rightMargin=72,
-                            leftMargin=72,
-                            topMargin=72,
-                            bottomMargin=72
-                        )
-                        
-                        styles = getSampleStyleSheet()
-                        title_style = ParagraphStyle(
-                            'CertTitle', parent=styles['Title'], fontSize=32, leading=36,
-                            alignment=TA_CENTER, textColor=colors.HexColor('#0B5394'), spaceAfter=18
-                        )
-                        subtitle_style = ParagraphStyle(
-                            'Subtitle', parent=styles['Heading2'], fontSize=14, leading=18,
-                            alignment=TA_CENTER, textColor=colors.HexColor('#475467'), spaceAfter=6
-                        )
-                        name_style = ParagraphStyle(
-                            'Name', parent=styles['Title'], fontSize=28, leading=32,
-                            alignment=TA_CENTER, textColor=colors.HexColor('#1F2937'), spaceAfter=10
-                        )
-                        body_style = ParagraphStyle(
-                            'Body', parent=styles['BodyText'], fontSize=12, leading=18,
-                            alignment=TA_CENTER, textColor=colors.HexColor('#475467'), spaceAfter=16
-                        )
-                        
-                        flowables = []
-                        flowables.append(Paragraph('Certificate of Completion', title_style))
-                        flowables.append(Paragraph('This is to certify that', subtitle_style))
-                        flowables.append(Paragraph(cert_data['recipient_name'], name_style))
-                        flowables.append(Paragraph('has successfully completed', subtitle_style))
-                        flowables.append(Paragraph(cert_data['course_title'], ParagraphStyle('Course', parent=title_style, fontSize=22, leading=26)))
-                        flowables.append(Spacer(1, 12))
-                        flowables.append(Paragraph(f"Issued by {cert_data['issuer']} on {cert_data['date_issued']}", body_style))
-                        
-                        # Signature section
-                        if cert_data['signature_name']:
-                            flowables.append(Spacer(1, 24))
-                            sig_table = Table([
-                                [Paragraph(cert_data['signature_name'], body_style)], 
-                                [Paragraph(cert_data['signature_title'] or '', body_style)]
-                            ], colWidths=[4*inch])
-                            sig_table.setStyle(TableStyle([
-                                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                ('LINEABOVE', (0, 0), (-1, 0), 0.8, colors.HexColor('#0B5394')),
-                            ]))
-                            flowables.append(sig_table)
-                        
-                        # Draw decorative border
-                        def draw_border(canvas, _doc):
-                            canvas.saveState()
-                            canvas.setLineWidth(5)
-                            canvas.setStrokeColor(colors.HexColor('#0B5394'))
-                            width, height = page_size
-                            margin = 28
-                            canvas.rect(margin, margin, width - 2*margin, height - 2*margin)
-                            canvas.setLineWidth(1.2)
-                            canvas.setStrokeColor(colors.HexColor('#D0D5DD'))
-                            inner = margin + 10
-                            canvas.rect(inner, inner, width - 2*inner, height - 2*inner)
-                            canvas.restoreState()
-                        
-                        doc.build(flowables, onFirstPage=draw_border, onLaterPages=draw_border)
-                        pdf_buffer.seek(0)
+                certificate_template = compiled_template('certificate')
+                # The whole batch runs in one render slot; shed it when none is free
+                gate = get_render_gate()
+                try:
+                    granted_at = gate.acquire()
+                except RenderBusy as busy:
+                    flash('Document generation is busy right now. Please try again in a minute.', 'warning')
+                    return render_template('bulk_certificates.html'), 503, {'Retry-After': str(busy.retry_after)}
+                try:
+                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                        for i, cert_data in enumerate(certificates):
+                            # Generate PDF for each certificate (styles compiled once, not per row)
+                            pdf_bytes = render_certificate(cert_data, certificate_template)
+
+                            # Add to ZIP and keep a stored copy for the file history
+                            filename = f"certificate_{i+1}_{cert_data['recipient_name'].replace(' ', '_')}.pdf"
+                            zip_file.writestr(filename, pdf_bytes)
+                            stored = storage.save(pdf_bytes, 'certificates', 'pdf')
                         
-                        # Add to ZIP
-                        filename = f"certificate_{i+1}_{cert_data['recipient_name'].replace(' ', '_')}.pdf"
-                        zip_file.writestr(filename, pdf_buffer.getvalue())
+                            # Save to database
+                            cert = Certificate(
+                                user_id=current_user.id,
+                                recipient_name=cert_data['recipient_name'],
+                                course_title=cert_data['course_title'],
+                                issuer=cert_data['issuer'],
+                                date_issued=cert_data['date_issued'],
+                                signature_name=cert_data['signature_name'],
+                                signature_title=cert_data['signature_title'],
+                                recipient_email=cert_data['recipient_email'] or None,
+                                pdf_path=stored.key
+                            )
+                            db.session.add(cert)
+                            db.session.flush()
+                            index_document('certificate', cert, path=stored.key, size=stored.size)
                         
-                        # Save to database
-                        cert = Certificate(
-                            user_id=current_user.id,
-                            recipient_name=cert_data['recipient_name'],
-                            course_title=cert_data['course_title'],
-                            issuer=cert_data['issuer'],
-                            date_issued=cert_data['date_issued'],
-                            signature_name=cert_data['signature_name'],
-                            signature_title=cert_data['signature_title'],
-                            pdf_path=f"bulk_certificate_{i+1}"
-                        )
-                        db.session.add(cert)
+                            # Queue delivery in the same transaction as the certificate
+                            if cert.recipient_email:
+                                html_body, text_body = render_email(
+                                    'certificate',
+                                    username=cert.recipient_name,
+                                    course_title=cert.course_title,
+                                    issuer=cert.issuer,
+                                    date_issued=cert.date_issued
+                                )
+                                queue_email(
+                                    f"Your certificate: {cert.course_title}",
+                                    [cert.recipient_email],
+                                    html=html_body,
+                                    body=text_body,
+                                    attachments=[(stored.key, filename)],
+                                    campaign=campaign,
+                                    user_id=current_user.id
+                                )
+                                emailed += 1
                 
+                finally:
+                    gate.release(granted_at)
+
                 db.session.commit()
                 zip_buffer.seek(0)
                 
                 flash(f'Successfully generated {len(certificates)} certificates!', 'success')
+                if emailed:
+                    flash(f'{emailed} certificates are being emailed to their recipients. '
+                          f'Track them under Email Deliveries.', 'info')
                 return send_file(
                     zip_buffer,
                     as_attachment=True,
@@ -208,10 +207,10 @@ def download_template():
         return redirect(url_for('billing.subscribe'))
     
     # Create CSV template
-    csv_content = """recipient_name,course_title,issuer,date_issued,signature_name,signature_title
-John Doe,Python Programming,Tech Academy,2025-01-15,Dr. Sarah Wilson,Course Director
-Jane Smith,Web Development,Code Institute,2025-01-16,Prof. Mike Brown,Head of Department
-Bob Johnson,Data Science,Data University,2025-01-17,Dr. Lisa Davis,Program Coordinator"""
+    csv_content = """recipient_name,course_title,issuer,date_issued,signature_name,signature_title,recipient_email
+John Doe,Python Programming,Tech Academy,2025-01-15,Dr. Sarah Wilson,Course Director,john@example.com
+Jane Smith,Web Development,Code Institute,2025-01-16,Prof. Mike Brown,Head of Department,jane@example.com
+Bob Johnson,Data Science,Data University,2025-01-17,Dr. Lisa Davis,Program Coordinator,"""
     
     csv_buffer = BytesIO()
     csv_buffer.write(csv_content.encode('utf-8'))
@@ -223,3 +222,230 @@ Bob Johnson,Data Science,Data University,2025-01-17,Dr. Lisa Davis,Program Coord
         download_name='certificate_template.csv',
         mimetype='text/csv'
     )
+
+
+@bulk_bp.route('/bulk-certificates/deliveries')
+@login_required
+def certificate_deliveries():
+    """Bulk certificate email sends for the current user, newest first"""
+    rows = db.session.query(
+        EmailOutbox.campaign,
+        db.func.count(EmailOutbox.id),
+        db.func.min(EmailOutbox.created_at)
+    ).filter(
+        EmailOutbox.user_id == current_user.id,
+        EmailOutbox.campaign.isnot(None)
+    ).group_by(EmailOutbox.campaign)\
+        .order_by(db.func.min(EmailOutbox.created_at).desc())\
+        .limit(50).all()
+    campaigns = [
+        {'id': campaign, 'total': total, 'created_at': created_at,
+         'status': campaign_status(campaign, current_user.id)}
+        for campaign, total, created_at in rows
+    ]
+    return render_template('certificate_deliveries.html', campaigns=campaigns)
+
+
+@bulk_bp.route('/bulk-certificates/deliveries/<campaign>')
+@login_required
+def certificate_delivery(campaign):
+    """Per-recipient delivery status for one bulk send"""
+    messages = EmailOutbox.query.filter_by(campaign=campaign, user_id=current_user.id)\
+        .order_by(EmailOutbox.id).all()
+    if not messages:
+        flash('Delivery not found', 'warning')
+        return redirect(url_for('bulk.certificate_deliveries'))
+    return render_template('certificate_delivery.html', campaign=campaign, messages=messages,
+                           status=campaign_status(campaign, current_user.id))
+
+
+class _ZipStream:
+    """Write-only sink that lets zipfile produce a ZIP incrementally"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive chunk by chunk from (name, bytes) pairs"""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in entries:
+            zip_file.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def qr_pool_workers(config):
+    return config.get('BULK_QR_WORKERS') or os.cpu_count() or 1
+
+
+def get_qr_pool(app):
+    """
+    The QR encoding pool of this process, shared by all bulk uploads so
+    concurrent uploads queue for the same BULK_QR_WORKERS processes. It is
+    created on first use and shut down at exit. Workers are started by a
+    fork server (spawned where there is none), never forked from this
+    multi-threaded web process, which could copy a lock another thread
+    holds; encoding only needs app.qr_engine.
+    """
+    pool = app.extensions.get('bulk_qr_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('bulk_qr_pool')
+            if pool is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                pool = ProcessPoolExecutor(max_workers=qr_pool_workers(app.config),
+                                           mp_context=multiprocessing.get_context(method))
+                atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+                app.extensions['bulk_qr_pool'] = pool
+    return pool
+
+
+def encode_qr_batch(jobs):
+    """Encode (spec, fmt) jobs in order; small batches in this thread, large ones in the pool"""
+    if len(jobs) <= current_app.config.get('BULK_QR_INLINE_ROWS', 100):
+        return [encode_job(job) for job in jobs]
+    app = current_app._get_current_object()
+    pool = get_qr_pool(app)
+    chunksize = max(1, len(jobs) // (qr_pool_workers(app.config) * 4))
+    try:
+        return list(pool.map(encode_job, jobs, chunksize=chunksize))
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool for the next upload
+        with _pool_lock:
+            if app.extensions.get('bulk_qr_pool') is pool:
+                del app.extensions['bulk_qr_pool']
+        raise
+
+
+def parse_qr_csv(file, max_rows):
+    """
+    Read QR payloads from an uploaded CSV with a ``data`` column and an
+    optional ``filename`` column. Returns (rows, error).
+    """
+    reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding='utf-8-sig'))
+    rows = []
+    try:
+        if not reader.fieldnames or 'data' not in [h.strip() for h in reader.fieldnames]:
+            return None, 'Missing required column: data'
+
+        for raw in reader:
+            i = reader.line_num
+            if None in raw:
+                # More fields than headers: an unquoted comma in the payload
+                return None, f'Row {i}: quote values that contain commas'
+            row = {k.strip(): (v or '').strip() for k, v in raw.items()}
+            if not row.get('data'):
+                continue
+            if len(row['data']) > 500:
+                return None, f'Row {i}: data must be at most 500 characters'
+            rows.append(row)
+            if len(rows) > max_rows:
+                return None, f'Too many rows. The maximum per upload is {max_rows}.'
+    except UnicodeDecodeError:
+        return None, 'File must be UTF-8 encoded CSV'
+    except csv.Error as e:
+        return None, f'Invalid CSV file: {e}'
+    if not rows:
+        return None, 'File must contain a header row and at least one data row'
+    return rows, None
+
+
+@bulk_bp.route('/bulk-qrcodes', methods=['GET', 'POST'])
+@login_required
+def bulk_qrcodes():
+    if not can_use_bulk_operations():
+        flash('Bulk operations require a Pro or Premium subscription. Please upgrade your plan.', 'warning')
+        return redirect(url_for('billing.subscribe'))
+    
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            flash('No file selected', 'error')
+            return redirect(request.url)
+        if not file.filename.lower().endswith('.csv'):
+            flash('Invalid file type. Please upload a CSV file.', 'error')
+            return redirect(request.url)
+        
+        fmt = request.form.get('format', 'png')
+        if fmt not in FORMATS:
+            fmt = 'png'
+        
+        rows, error = parse_qr_csv(file, current_app.config.get('BULK_QR_MAX_ROWS', 10000))
+        if error:
+            flash(error, 'error')
+            return redirect(request.url)
+        
+        # Quota is checked once for the whole batch
+        can_create, message = check_usage_limit('qrcode', count=len(rows))
+        if not can_create:
+            flash(f'Cannot create {len(rows)} QR codes: {message}', 'warning')
+            return redirect(request.url)
+        
+        try:
+            # Results come back in input order
+            encoded = encode_qr_batch([(make_spec(row['data']), fmt) for row in rows])
+            
+            storage = get_storage()
+            entries = []
+            records = []
+            stored_files = []
+            for i, (row, data) in enumerate(zip(rows, encoded), 1):
+                stored = storage.save(data, 'qrcodes', fmt)
+                stored_files.append(stored)
+                name = secure_filename(row.get('filename', '')) or f'qrcode_{i}'
+                entries.append((f'{i:05d}_{name}.{fmt}', data))
+                records.append(QRCode(user_id=current_user.id, data=row['data'], img_path=stored.key))
+            
+            # One batched INSERT for the QR rows, one for their index entries
+            db.session.add_all(records)
+            db.session.flush()
+            for record, stored in zip(records, stored_files):
+                index_document('qrcode', record, path=stored.key, size=stored.size)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error processing file: {str(e)}', 'error')
+            return redirect(request.url)
+        
+        download_name = f'qrcodes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+        return Response(
+            stream_with_context(stream_zip(entries)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+        )
+    
+    return render_template('bulk_qrcodes.html', formats=list(FORMATS))
+
+@bulk_bp.route('/bulk-qrcodes/template')
+@login_required
+def download_qr_template():
+    """Download CSV template for bulk QR code generation"""
+    if not can_use_bulk_operations():
+        flash('Bulk operations require a Pro or Premium subscription. Please upgrade your plan.', 'warning')
+        return redirect(url_for('billing.subscribe'))
+    
+    csv_content = """data,filename
+https://example.com/tickets/1001,ticket_1001
+https://example.com/tickets/1002,ticket_1002
+https://example.com/tickets/1003,ticket_1003"""
+    
+    return send_file(
+        BytesIO(csv_content.encode('utf-8')),
+        as_attachment=True,
+        download_name='qrcode_template.csv',
+        mimetype='text/csv'
+    )
@@ -0,0 +1,162 @@
+"""
+Unified document index shared by every generator and the admin file browser
+"""
+import base64
+import os
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+from app.models import DocumentIndex, Invoice, Resume, Certificate, QRCode, db
+
+# Admin URL values (plural) mapped to the doc_type stored in the index
+FILE_TYPES = {
+    'invoices': 'invoice',
+    'resumes': 'resume',
+    'certificates': 'certificate',
+    'qrcodes': 'qrcode',
+}
+
+DocumentPage = namedtuple('DocumentPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def document_label(doc_type, record):
+    """Short human readable description stored alongside the index row"""
+    if doc_type == 'invoice':
+        label = f"{record.company} - {record.client}"
+    elif doc_type == 'resume':
+        label = record.name
+    elif doc_type == 'certificate':
+        label = f"{record.recipient_name} - {record.course_title}"
+    elif doc_type == 'qrcode':
+        label = record.data
+    else:
+        label = ''
+    return (label or '')[:200]
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+def index_document(doc_type, record, path=None, size=None):
+    """
+    Add an index row for a freshly generated document.
+    The record must already be flushed so it has an id; the caller commits.
+    """
+    entry = DocumentIndex(
+        doc_type=doc_type,
+        document_id=record.id,
+        user_id=record.user_id,
+        label=document_label(doc_type, record),
+        size=size if size is not None else _file_size(path),
+        path=path,
+        created_at=record.created_at or datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def encode_cursor(entry):
+    raw = f"{entry.created_at.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, entry_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def query_documents(doc_type=None, user_id=None, start=None, end=None,
+                    after=None, before=None, per_page=50):
+    """
+    Keyset-paginated listing of the document index, newest first.
+
+    ``after`` continues to older rows, ``before`` goes back to newer rows.
+    Each page is a single range scan on (created_at, id) so the cost does
+    not grow with how deep into the listing the admin has browsed.
+    """
+    query = DocumentIndex.query.options(joinedload(DocumentIndex.user))
+    if doc_type:
+        query = query.filter(DocumentIndex.doc_type == doc_type)
+    if user_id:
+        query = query.filter(DocumentIndex.user_id == user_id)
+    if start:
+        query = query.filter(DocumentIndex.created_at >= start)
+    if end:
+        query = query.filter(DocumentIndex.created_at < end)
+
+    key = tuple_(DocumentIndex.created_at, DocumentIndex.id)
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before) if not after_key else None
+
+    if before_key:
+        rows = query.filter(key > before_key)\
+            .order_by(DocumentIndex.created_at.asc(), DocumentIndex.id.asc())\
+            .limit(per_page + 1).all()
+        has_newer = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        next_cursor = encode_cursor(rows[-1]) if rows else None
+        prev_cursor = encode_cursor(rows[0]) if rows and has_newer else None
+        return DocumentPage(rows, next_cursor, prev_cursor)
+
+    if after_key:
+        query = query.filter(key < after_key)
+    rows = query.order_by(DocumentIndex.created_at.desc(), DocumentIndex.id.desc())\
+        .limit(per_page + 1).all()
+    has_older = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(rows[-1]) if rows and has_older else None
+    prev_cursor = encode_cursor(rows[0]) if rows and after_key else None
+    return DocumentPage(rows, next_cursor, prev_cursor)
+
+
+def delete_user_documents(user_id):
+    """Remove every index row owned by a user (the caller commits)"""
+    DocumentIndex.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+
+def is_path_referenced(path):
+    """True if any indexed document still points at this stored file"""
+    return db.session.query(DocumentIndex.id).filter(DocumentIndex.path == path).first() is not None
+
+
+def backfill_document_index(batch_size=1000):
+    """Index documents created before the index existed. Safe to re-run."""
+    sources = {
+        'invoice': (Invoice, 'pdf_path'),
+        'resume': (Resume, 'pdf_path'),
+        'certificate': (Certificate, 'pdf_path'),
+        'qrcode': (QRCode, 'img_path'),
+    }
+    created = 0
+    for doc_type, (model, path_attr) in sources.items():
+        last_id = 0
+        while True:
+            batch = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            ids = [record.id for record in batch]
+            existing = {
+                row.document_id for row in db.session.query(DocumentIndex.document_id).filter(
+                    DocumentIndex.doc_type == doc_type,
+                    DocumentIndex.document_id.in_(ids)
+                )
+            }
+            for record in batch:
+                if record.id not in existing:
+                    index_document(doc_type, record, path=getattr(record, path_attr))
+                    created += 1
+            db.session.commit()
+            last_id = ids[-1]
+    return created
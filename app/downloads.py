@@ -0,0 +1,136 @@
+"""
+Signed, expiring download URLs for stored files
+
+Generators and file listings link to /files/<token> instead of a static
+path. The token is signed with SECRET_KEY and carries the storage key, the
+download name and whether to send it as an attachment, so the view does no
+database work. After checking the signature the actual transfer is handed
+off where possible:
+
+    DOWNLOAD_ACCEL=nginx   X-Accel-Redirect to DOWNLOAD_ACCEL_PREFIX + key
+    DOWNLOAD_ACCEL=apache  X-Sendfile with the absolute path
+    S3 backend             redirect to a presigned URL
+    otherwise              send_file() with conditional/Range support
+
+Stored keys are content addressed, so the SHA-256 in the key is a strong
+ETag and responses can be cached as immutable. Example nginx location for
+the default local storage root:
+
+    location /protected-files/ {
+        internal;
+        alias /path/to/instance/files/;
+    }
+"""
+import math
+import mimetypes
+import os
+import time
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, abort, redirect, request, send_file, url_for
+from itsdangerous import URLSafeSerializer, BadSignature
+from werkzeug.http import http_date, quote_etag
+from app.storage import get_storage
+
+downloads_bp = Blueprint('downloads', __name__)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='file-download')
+
+
+def signed_url(key, download_name=None, as_attachment=True, external=False):
+    """
+    Build a signed, expiring URL for a stored file key.
+
+    The expiry is rounded up to a multiple of the lifetime, so the same file
+    gets the same URL for a while and browsers can reuse their cached copy.
+    """
+    lifetime = current_app.config.get('DOWNLOAD_URL_EXPIRES', 3600)
+    payload = {
+        'k': key,
+        'n': download_name or os.path.basename(key),
+        'a': 1 if as_attachment else 0,
+        'e': int(math.ceil((time.time() + lifetime) / lifetime) * lifetime)
+    }
+    return url_for('downloads.download', token=_serializer().dumps(payload), _external=external)
+
+
+def file_url(key, download_name=None, as_attachment=False):
+    """Template helper: signed URL for a stored file key (or legacy path)"""
+    if not key:
+        return None
+    return signed_url(key, download_name, as_attachment=as_attachment)
+
+
+def _content_etag(key):
+    """SHA-256 from a content-addressed key, or None for legacy paths"""
+    stem = os.path.splitext(os.path.basename(key))[0]
+    if not os.path.isabs(key) and len(stem) == 64:
+        return stem
+    return None
+
+
+def _content_disposition(download_name, as_attachment):
+    kind = 'attachment' if as_attachment else 'inline'
+    safe_name = download_name.replace('"', '')
+    return f'{kind}; filename="{safe_name}"'
+
+
+@downloads_bp.route('/files/<token>')
+def download(token):
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        abort(404)
+    if payload.get('e', 0) < time.time():
+        abort(410)
+
+    key = payload['k']
+    download_name = payload['n']
+    as_attachment = bool(payload.get('a'))
+    storage = get_storage()
+    etag = _content_etag(key)
+
+    # Content never changes for a key, so a matching ETag is always a 304
+    if etag and etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    path = storage.path(key)
+    if path is None:
+        # Remote object: let the object store serve bytes, Range and ETag
+        return redirect(storage.url(key, download_name=download_name, as_attachment=as_attachment))
+
+    if not os.path.exists(path):
+        abort(404)
+
+    accel = (current_app.config.get('DOWNLOAD_ACCEL') or '').lower()
+    if accel and etag:
+        stat = os.stat(path)
+        response = current_app.response_class()
+        response.headers['Content-Type'] = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+        response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+        response.headers['ETag'] = quote_etag(etag)
+        response.headers['Last-Modified'] = http_date(datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc))
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        if accel == 'nginx':
+            prefix = current_app.config.get('DOWNLOAD_ACCEL_PREFIX', '/protected-files/')
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + key
+        elif accel == 'apache':
+            response.headers['X-Sendfile'] = path
+        else:
+            abort(500)
+        return response
+
+    response = send_file(
+        path,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=etag or True,
+        conditional=True
+    )
+    if etag:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,291 @@
+"""
+Plan entitlements
+
+Plan definitions (PLAN_DEFAULTS, overridden per plan by PlanDefinition rows
+edited in the admin panel) are compiled once into an immutable table of
+Plan tuples: read-only limit mappings, template sets and levels for the
+plan hierarchy. Nothing is rebuilt per call.
+
+current_entitlements() resolves the logged-in user's plan once per request
+and memoizes it on ``g``, together with the monthly usage counts it had to
+query, so a view that checks a quota, the premium template flag and the
+limits pays for one lookup and one count query.
+
+Workers notice plan edits by polling a version stamp (row count and latest
+updated_at of plan_definition) at most every ENTITLEMENTS_REFRESH_INTERVAL
+seconds; the worker that saved the edit reloads immediately.
+"""
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+from flask import current_app, g, has_request_context
+from flask_login import current_user
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models import PlanDefinition, Invoice, Resume, Certificate, QRCode
+
+PLAN_DEFAULTS = {
+    'free': {
+        'level': 0,
+        'invoices_per_month': 5,
+        'resumes_per_month': 3,
+        'certificates_per_month': 2,
+        'qrcodes_per_month': 10,
+        'templates': ['basic'],
+        'bulk_operations': False,
+        'premium_templates': False,
+        'requests_per_minute': 10,  # token bucket refill rate
+        'burst': 20  # token bucket capacity
+    },
+    'basic': {
+        'level': 1,
+        'invoices_per_month': 50,
+        'resumes_per_month': 25,
+        'certificates_per_month': 20,
+        'qrcodes_per_month': 100,
+        'templates': ['basic', 'professional'],
+        'bulk_operations': False,
+        'premium_templates': False,
+        'requests_per_minute': 30,
+        'burst': 60
+    },
+    'pro': {
+        'level': 2,
+        'invoices_per_month': 200,
+        'resumes_per_month': 100,
+        'certificates_per_month': 100,
+        'qrcodes_per_month': 500,
+        'templates': ['basic', 'professional', 'modern'],
+        'bulk_operations': True,
+        'premium_templates': True,
+        'requests_per_minute': 120,
+        'burst': 240
+    },
+    'premium': {
+        'level': 3,
+        'invoices_per_month': -1,  # unlimited
+        'resumes_per_month': -1,
+        'certificates_per_month': -1,
+        'qrcodes_per_month': -1,
+        'templates': ['basic', 'professional', 'modern', 'executive'],
+        'bulk_operations': True,
+        'premium_templates': True,
+        'requests_per_minute': 600,
+        'burst': 1200
+    }
+}
+
+# Fields an admin can edit, with their types
+EDITABLE_FIELDS = {
+    'invoices_per_month': int,
+    'resumes_per_month': int,
+    'certificates_per_month': int,
+    'qrcodes_per_month': int,
+    'requests_per_minute': int,
+    'burst': int,
+    'bulk_operations': bool,
+    'premium_templates': bool,
+    'templates': list,
+}
+
+USAGE_MODELS = {
+    'invoice': Invoice,
+    'resume': Resume,
+    'certificate': Certificate,
+    'qrcode': QRCode,
+}
+
+Plan = namedtuple('Plan', ['name', 'level', 'limits', 'templates'])
+
+
+def compile_plans(defaults, overrides=None):
+    """Merge overrides into the defaults and freeze the result"""
+    plans = {}
+    for name, base in defaults.items():
+        values = dict(base)
+        values.update((overrides or {}).get(name, {}))
+        values['templates'] = tuple(values.get('templates', ()))
+        plans[name] = Plan(name, values['level'], MappingProxyType(values), frozenset(values['templates']))
+    return MappingProxyType(plans)
+
+
+class PlanTable:
+    """The compiled plans of this process, refreshed when the version stamp changes"""
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self.plans = compile_plans(PLAN_DEFAULTS)
+        self.version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        if time.monotonic() - self._checked_at >= self.refresh_interval:
+            self._refresh()
+        return self.plans
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.refresh_interval:
+                return  # another thread just did it
+            self._checked_at = now
+            try:
+                version = tuple(db.session.query(func.count(PlanDefinition.id),
+                                                 func.max(PlanDefinition.updated_at)).one())
+                if version != self.version:
+                    overrides = {row.name: row.limits_dict for row in PlanDefinition.query.all()}
+                    self.plans = compile_plans(PLAN_DEFAULTS, overrides)
+                    self.version = version
+            except SQLAlchemyError:
+                # plan_definition not created yet (run update_database.py); keep the defaults
+                db.session.rollback()
+
+
+class UserEntitlements:
+    """What one user may do, resolved against the compiled plans"""
+
+    def __init__(self, user, plan, plans, is_admin=False):
+        self.user = user
+        self.plan = plan
+        self.plans = plans
+        self.is_admin = is_admin
+        self._usage = {}
+
+    @property
+    def limits(self):
+        return self.plan.limits
+
+    @property
+    def premium_templates(self):
+        return self.is_admin or self.plan.limits.get('premium_templates', False)
+
+    @property
+    def bulk_operations(self):
+        return self.is_admin or self.plan.limits.get('bulk_operations', False)
+
+    def has_plan(self, required='basic'):
+        """Plans: free < basic < pro < premium"""
+        if self.is_admin:
+            return True
+        required_plan = self.plans.get(required, self.plans['basic'])
+        return self.plan.level >= required_plan.level
+
+    def monthly_limit(self, file_type):
+        if self.is_admin:
+            return -1
+        return self.plan.limits.get(f"{file_type}s_per_month", 0)
+
+    def usage(self, file_type):
+        """Files of this type created this month (queried once per request)"""
+        if file_type not in self._usage:
+            model = USAGE_MODELS[file_type]
+            current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            self._usage[file_type] = model.query.filter(
+                model.user_id == self.user.id,
+                model.created_at >= current_month
+            ).count()
+        return self._usage[file_type]
+
+    def check_usage(self, file_type, count=1):
+        """
+        Check the monthly quota for a file type. ``count`` is the number of
+        files about to be created, so bulk operations can be checked against
+        the quota once per batch. Returns (allowed, message).
+        """
+        if not getattr(self.user, 'is_authenticated', False):
+            return False, "Please log in to use this feature"
+        if self.is_admin:
+            return True, "Unlimited usage (Admin access)"
+        if file_type not in USAGE_MODELS:
+            return False, "Invalid file type"
+
+        monthly_limit = self.monthly_limit(file_type)
+        if monthly_limit == -1:
+            return True, "Unlimited usage"
+
+        used = self.usage(file_type)
+        if used + count > monthly_limit:
+            if count > 1 and used < monthly_limit:
+                return False, f"Only {monthly_limit - used} of your monthly limit of {monthly_limit} {file_type}s remain. Please upgrade your plan for more."
+            return False, f"You have reached your monthly limit of {monthly_limit} {file_type}s. Please upgrade your plan for more."
+        return True, f"{monthly_limit - used} {file_type}s remaining this month"
+
+
+def init_entitlements(app):
+    app.extensions['entitlements'] = PlanTable(app.config.get('ENTITLEMENTS_REFRESH_INTERVAL', 5.0))
+    return app.extensions['entitlements']
+
+
+def get_plans():
+    return current_app.extensions['entitlements'].current()
+
+
+def resolve_entitlements(user):
+    plans = get_plans()
+    # Admin users always have premium access
+    is_admin = bool(getattr(user, 'is_super_admin', False))
+    name = 'premium' if is_admin else (getattr(user, 'subscription_status', None) or 'free')
+    return UserEntitlements(user, plans.get(name, plans['free']), plans, is_admin)
+
+
+def current_entitlements():
+    """The current user's entitlements, resolved once per request"""
+    if not has_request_context():
+        return resolve_entitlements(current_user._get_current_object())
+    user = current_user._get_current_object()
+    key = (type(user).__name__, user.get_id() if user.is_authenticated else None)
+    cached = g.get('_entitlements')
+    if cached is None or cached[0] != key:
+        # Re-resolved if the user changes mid-request (login, logout)
+        cached = g._entitlements = (key, resolve_entitlements(user))
+    return cached[1]
+
+
+def parse_plan_form(form):
+    """Editable plan fields from a submitted admin form, typed"""
+    values = {}
+    for field, kind in EDITABLE_FIELDS.items():
+        if kind is bool:
+            values[field] = form.get(field) == 'on'
+        elif kind is list:
+            values[field] = [item.strip() for item in form.get(field, '').split(',') if item.strip()]
+        else:
+            raw = form.get(field, '').strip()
+            if raw:
+                values[field] = int(raw)
+    for field in ('requests_per_minute', 'burst'):
+        if values.get(field, 1) < 1:
+            raise ValueError(f"{field} must be at least 1")
+    return values
+
+
+def save_plan(name, limits):
+    """Store an admin edit of a plan; other workers pick it up on their next poll"""
+    if name not in PLAN_DEFAULTS:
+        raise ValueError(f"Unknown plan: {name}")
+    row = PlanDefinition.query.filter_by(name=name).first()
+    if row is None:
+        row = PlanDefinition(name=name)
+        db.session.add(row)
+    row.limits = json.dumps(limits)
+    row.updated_at = datetime.utcnow()
+    db.session.commit()
+    current_app.extensions['entitlements'].invalidate()
+    return row
+
+
+def reset_plan(name):
+    """Drop the admin edits of a plan, back to PLAN_DEFAULTS"""
+    if name not in PLAN_DEFAULTS:
+        raise ValueError(f"Unknown plan: {name}")
+    PlanDefinition.query.filter_by(name=name).delete()
+    db.session.commit()
+    current_app.extensions['entitlements'].invalidate()
@@ -15,22 +15,45 @@ class LoginForm(FlaskForm):
     submit = SubmitField('Login')
 
 
-from wtforms import TextAreaField, FloatField
+from flask_wtf.file import FileField, FileAllowed
+from wtforms import TextAreaField, FloatField, SelectField
+from wtforms.validators import Optional
 
 class InvoiceForm(FlaskForm):
     company = StringField('Company', validators=[DataRequired()])
     client = StringField('Client', validators=[DataRequired()])
     gst = StringField('GST Number', validators=[DataRequired()])
-    items = TextAreaField('Items (one per line)', validators=[DataRequired()])
-    total = FloatField('Total Amount', validators=[DataRequired()])
+    items = TextAreaField('Items (one per line)', validators=[Optional()])
+    items_file = FileField('Or upload line items (CSV)', validators=[FileAllowed(['csv'], 'CSV files only')])
+    total = FloatField('Total Amount (optional, defaults to the sum of the items)', validators=[Optional()])
+    template_id = SelectField('Template', coerce=int, default=0, choices=[(0, 'Default')])
     submit = SubmitField('Generate Invoice')
 
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators):
+            return False
+        if not (self.items.data or '').strip() and not self.items_file.data:
+            self.items.errors.append('Enter the items or upload a CSV file.')
+            return False
+        return True
+
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField
-from wtforms.validators import DataRequired, Length, URL
+from flask_wtf.file import FileField, FileAllowed
+from wtforms import StringField, SubmitField, SelectField
+from wtforms.validators import DataRequired, Length, URL, Regexp
 
 class QRCodeForm(FlaskForm):
     data = StringField('Enter URL or Text', validators=[DataRequired(), Length(min=1, max=500)])
+    output_format = SelectField('Format', choices=[
+        ('png', 'PNG image'),
+        ('svg', 'SVG (vector)'),
+        ('pdf', 'PDF (vector, print ready)')
+    ], default='png')
+    fill_color = StringField('Foreground Color', default='#000000',
+                             validators=[Regexp(r'^#[0-9a-fA-F]{6}$', message='Use a hex color like #1a2b3c')])
+    back_color = StringField('Background Color', default='#ffffff',
+                             validators=[Regexp(r'^#[0-9a-fA-F]{6}$', message='Use a hex color like #1a2b3c')])
+    logo = FileField('Logo (optional)', validators=[FileAllowed(['png', 'jpg', 'jpeg'], 'PNG or JPEG images only')])
     submit = SubmitField('Generate QR Code')
 
 #Resume Builder
@@ -45,6 +68,7 @@ class ResumeForm(FlaskForm):
     education = TextAreaField('Education', validators=[Optional(), Length(max=1000)])
     skills = TextAreaField('Skills', validators=[Optional(), Length(max=1000)])
     experience = TextAreaField('Experience', validators=[Optional(), Length(max=1500)])
+    template_id = SelectField('Template', coerce=int, default=0, choices=[(0, 'Default')])
     submit = SubmitField('Generate Resume')
 
 # Certificate Generator
@@ -57,4 +81,5 @@ class CertificateForm(FlaskForm):
     date_issued = StringField('Date (e.g., 10 Sep 2025)', validators=[DataRequired(), Length(max=40)])
     signature_name = StringField('Signer Name', validators=[Optional(), Length(max=100)])
     signature_title = StringField('Signer Title', validators=[Optional(), Length(max=100)])
+    template_id = SelectField('Template', coerce=int, default=0, choices=[(0, 'Default')])
     submit = SubmitField('Generate Certificate')
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Invoice line items
+
+Items come from the form's textarea (one "Description - amount" per line)
+or from an uploaded CSV file, which is parsed row by row straight from the
+upload stream. Either way the result is a list of LineItem tuples with
+Decimal amounts (None for a line without an amount).
+
+CSV files may start with a header naming the columns (description/item,
+amount, quantity/qty, unit_price/rate/price); without one the columns are
+description, amount. With quantity and unit price the amount is their
+product.
+"""
+import csv
+import io
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+LineItem = namedtuple('LineItem', ['description', 'amount'])
+
+MAX_DESCRIPTION = 1000  # characters; longer descriptions are cut
+
+HEADER_ALIASES = {
+    'description': 'description', 'item': 'description', 'details': 'description',
+    'amount': 'amount', 'total': 'amount', 'line_total': 'amount',
+    'quantity': 'quantity', 'qty': 'quantity',
+    'unit_price': 'unit_price', 'rate': 'unit_price', 'price': 'unit_price',
+}
+
+_CURRENCY_RE = re.compile(r'^(?:rs\.?|inr|₹)\s*', re.IGNORECASE)
+
+# "description - amount": the amount holds no '-' other than its own sign
+_TEXT_ITEM_RE = re.compile(r'^(.*?\S)\s*-\s*(-?[^-]*)$')
+
+
+def parse_amount(value):
+    """'12,500.50', 'Rs. 300', '₹40' -> Decimal; raises ValueError"""
+    text = _CURRENCY_RE.sub('', (value or '').strip()).replace(',', '').strip()
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount
+
+
+def parse_text_items(text):
+    """
+    One item per line; the amount follows the last '-' separator and may
+    itself start with a minus ("Discount - -500"). Hyphens and commas are
+    part of the description (or of the amount, as thousands separators).
+    """
+    items = []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = _TEXT_ITEM_RE.match(line)
+        if match:
+            try:
+                items.append(LineItem(match.group(1)[:MAX_DESCRIPTION], parse_amount(match.group(2))))
+                continue
+            except ValueError:
+                pass
+        items.append(LineItem(line[:MAX_DESCRIPTION], None))
+    return items
+
+
+def _columns(row):
+    names = [HEADER_ALIASES.get(cell.strip().lower().replace(' ', '_')) for cell in row]
+    if 'description' not in names or not ({'amount', 'unit_price'} & set(names)):
+        return None
+    return {name: index for index, name in reversed(list(enumerate(names))) if name}
+
+
+def iter_csv_items(stream, max_items=None, encoding='utf-8-sig'):
+    """
+    Yield LineItems from a binary CSV stream without reading it into memory
+    first. Raises ValueError naming the offending line.
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding=encoding, newline=''))
+    columns = None
+    count = 0
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            columns = _columns(row)
+            if columns is not None:
+                continue  # header row
+            columns = {'description': 0, 'amount': 1}
+
+        def cell(name):
+            index = columns.get(name)
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        try:
+            if cell('amount'):
+                amount = parse_amount(cell('amount'))
+            elif cell('unit_price'):
+                amount = parse_amount(cell('unit_price')) * parse_amount(cell('quantity') or '1')
+            else:
+                amount = None
+        except ValueError as e:
+            raise ValueError(f"Line {reader.line_num}: {e}")
+        description = cell('description')[:MAX_DESCRIPTION]
+        if not description and amount is None:
+            continue
+        count += 1
+        if max_items and count > max_items:
+            raise ValueError(f"Too many line items (the limit is {max_items})")
+        yield LineItem(description, amount)
+
+
+def items_total(items):
+    return sum((item.amount for item in items if item.amount is not None), Decimal('0'))
+
+
+def items_text(items):
+    """Items back in the textarea format, for the invoice record"""
+    return '\n'.join(
+        f"{item.description} - {item.amount}" if item.amount is not None else item.description
+        for item in items
+    )
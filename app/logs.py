@@ -0,0 +1,185 @@
+"""
+Structured, non-blocking logging
+
+Request threads only put records on an in-memory queue (QueueHandler). A
+QueueListener thread formats them as JSON lines and does the disk I/O:
+
+    LOG_FILE         every record, size-rotated (LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+    LOGIN_LOG_FILE   only login/logout events (the 'app.login' logger)
+    stderr           human readable copy when LOG_CONSOLE is on
+
+Each record carries the id of the request that produced it (taken from an
+incoming X-Request-ID header or generated, and echoed on the response).
+Structured fields are passed with ``extra={'event': {...}}`` and appear as
+top level keys in the JSON line. Noisy event types can be sampled with
+LOG_SAMPLE_RATES, e.g. "not_found=0.1,activity_check=0.05"; kept records
+of a sampled type carry ``sample_rate`` so counts can be scaled back up.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+
+LOGIN_LOGGER = 'app.login'
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (runs on the request thread)"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records for configured ``event_type`` values"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event_type', None))
+        if rate is None:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        event_type = getattr(record, 'event_type', None)
+        if event_type:
+            data['event_type'] = event_type
+        event = getattr(record, 'event', None)
+        if event:
+            data.update(event)
+        if getattr(record, 'sample_rate', None) is not None:
+            data['sample_rate'] = record.sample_rate
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    QueueHandler that only resolves the message on the calling thread and
+    leaves the formatting (JSON, tracebacks aside) to the listener.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def parse_sample_rates(value):
+    """"not_found=0.1,activity_check=0.05" -> {'not_found': 0.1, ...}"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            try:
+                rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+            except ValueError:
+                continue
+    return rates
+
+
+def _file_handler(path, config, formatter):
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backupCount=config.get('LOG_BACKUP_COUNT', 5),
+        encoding='utf-8',
+        delay=True
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+def init_logging(app):
+    """
+    Route all logging through a queue and start the writer thread. The
+    pipeline is process wide, so only the first app created sets it up.
+    """
+    global _listener
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        if g.get('request_id'):
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    if _listener is not None:
+        return _listener
+
+    config = app.config
+    formatter = JSONFormatter()
+    handlers = []
+
+    main_handler = _file_handler(config.get('LOG_FILE', 'app.log'), config, formatter)
+    handlers.append(main_handler)
+
+    if config.get('LOGIN_LOG_FILE'):
+        login_handler = _file_handler(config['LOGIN_LOG_FILE'], config, formatter)
+        login_handler.addFilter(logging.Filter(LOGIN_LOGGER))
+        handlers.append(login_handler)
+
+    if config.get('LOG_CONSOLE', True):
+        console = logging.StreamHandler(sys.stderr)
+        console.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+        handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(config.get('LOG_SAMPLE_RATES'))))
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def restart_after_fork():
+    """
+    Start a writer thread in a forked child process (the parent's thread
+    does not exist there). Returns the child's listener, or None.
+    """
+    global _listener
+    if _listener is None:
+        return None
+    _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
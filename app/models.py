@@ -1,6 +1,7 @@
 from . import db
 from flask_login import UserMixin
 from app import login_manager  # make sure this import exists!
+import json
 from datetime import datetime
 
 class User(db.Model, UserMixin):
@@ -103,6 +104,7 @@ class Certificate(db.Model):
     date_issued = db.Column(db.String(40), nullable=False)
     signature_name = db.Column(db.String(100))
     signature_title = db.Column(db.String(100))
+    recipient_email = db.Column(db.String(120))  # set for bulk certificates that are emailed out
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     pdf_path = db.Column(db.String(200))
 
@@ -117,4 +119,134 @@ class Template(db.Model):
     template_data = db.Column(db.Text)  # JSON data for template configuration
     preview_image = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_active = db.Column(db.Boolean, default=True)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # template registry refresh signal
+    is_active = db.Column(db.Boolean, default=True)
+
+class DocumentIndex(db.Model):
+    """One row per generated file, across every document type.
+
+    Lets the admin file browser page through all documents with a single
+    indexed keyset query instead of querying each type table separately.
+    """
+    __tablename__ = 'document_index'
+
+    id = db.Column(db.Integer, primary_key=True)
+    doc_type = db.Column(db.String(20), nullable=False)  # invoice, resume, certificate, qrcode
+    document_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    label = db.Column(db.String(200))
+    size = db.Column(db.Integer)
+    path = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.UniqueConstraint('doc_type', 'document_id', name='uq_document_index_source'),
+        db.Index('ix_document_index_created', 'created_at', 'id'),
+        db.Index('ix_document_index_type_created', 'doc_type', 'created_at', 'id'),
+        db.Index('ix_document_index_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_document_index_path', 'path'),
+    )
+
+class EmailOutbox(db.Model):
+    """Outgoing email waiting for the background sender.
+
+    Requests only insert a row here; app/outbox.py delivers pending rows in
+    batches over a reused SMTP connection and retries failures with backoff.
+    """
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    subject = db.Column(db.String(255), nullable=False)
+    body_text = db.Column(db.Text)
+    body_html = db.Column(db.Text)
+    attachments = db.Column(db.Text)  # JSON list of {key, filename, content_type} in file storage
+    campaign = db.Column(db.String(40))  # groups the messages of one bulk send
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # who triggered a bulk send
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_due', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_campaign', 'campaign', 'id'),
+        db.Index('ix_email_outbox_user_campaign', 'user_id', 'campaign'),
+    )
+
+    @property
+    def recipient_list(self):
+        return json.loads(self.recipients)
+
+class SecurityEvent(db.Model):
+    """Security events (failed logins, 429s, 403s, ...) for the admin security page.
+
+    Rows are written in batches by app/security_events.py and pruned by
+    day once they are older than SECURITY_EVENT_RETENTION_DAYS.
+    """
+    __tablename__ = 'security_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    event_type = db.Column(db.String(40), nullable=False)
+    user_id = db.Column(db.Integer)  # user or admin id, not a foreign key
+    ip_address = db.Column(db.String(45))
+    path = db.Column(db.String(200))
+    details = db.Column(db.Text)  # JSON
+
+    __table_args__ = (
+        db.Index('ix_security_event_created', 'created_at'),
+        db.Index('ix_security_event_type_created', 'event_type', 'created_at'),
+        db.Index('ix_security_event_ip_created', 'ip_address', 'created_at'),
+        db.Index('ix_security_event_user_created', 'user_id', 'created_at'),
+    )
+
+    @property
+    def details_dict(self):
+        return json.loads(self.details) if self.details else {}
+
+class PlanDefinition(db.Model):
+    """Admin edits of a subscription plan's entitlements.
+
+    Plans start from PLAN_DEFAULTS in app/entitlements.py and a row here
+    overrides the values it lists. updated_at doubles as the change signal
+    every worker polls to refresh its compiled plan table.
+    """
+    __tablename__ = 'plan_definition'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), unique=True, nullable=False)  # free, basic, pro, premium
+    limits = db.Column(db.Text, nullable=False)  # JSON
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_plan_definition_updated', 'updated_at'),
+    )
+
+    @property
+    def limits_dict(self):
+        return json.loads(self.limits) if self.limits else {}
+
+class RenderJob(db.Model):
+    """A document render deferred because the render path was saturated.
+
+    The request that was shed gets a 202 with a polling URL for this row;
+    a background thread of the same web process renders the document and
+    records the stored file (or the error) here. See app/render_jobs.py.
+    """
+    __tablename__ = 'render_job'
+
+    id = db.Column(db.String(32), primary_key=True)  # random hex, used in the polling URL
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # invoice, resume, certificate
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed
+    download_name = db.Column(db.String(100))
+    file_key = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,311 @@
+"""
+Persistent email outbox with a background SMTP sender
+
+Views never talk to the mail server. They call queue_email(), which adds an
+EmailOutbox row to the current transaction, and a worker delivers pending
+rows in batches:
+
+    - one SMTP connection (TLS handshake + login) is reused across batches
+      and closed after EMAIL_SMTP_IDLE_TIMEOUT seconds without mail
+    - each row is claimed with a conditional UPDATE, so several workers can
+      drain the same table without sending a message twice
+    - failures are retried with exponential backoff and marked 'failed'
+      after EMAIL_OUTBOX_MAX_ATTEMPTS
+    - EMAIL_SMTP_CONNECTIONS workers (one connection each) drain the table
+      in parallel, sharing one EMAIL_RATE_LIMIT (messages/second) budget;
+      MAIL_MAX_EMAILS caps how many messages go over one connection before
+      it is reopened
+
+Each row's status is the delivery status for its recipients, so bulk sends
+(grouped by ``campaign``) can report per-recipient progress.
+
+The worker runs as a daemon thread of the web process (EMAIL_WORKER=thread,
+the default) or as its own process (EMAIL_WORKER=external, then run
+``python run_email_worker.py``). For local testing point MAIL_SERVER at an
+SMTP stand-in, for example:
+
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false python run_email_worker.py
+"""
+import json
+import logging
+import mimetypes
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import and_, or_
+from app import db, mail
+from app.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection itself is unusable
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+def queue_email(subject, recipients, html=None, body=None, attachments=None, campaign=None, user_id=None):
+    """
+    Add an email to the outbox. The row is part of the caller's transaction,
+    so it is only sent if the caller commits.
+
+    ``attachments`` is a list of (storage key, filename) pairs; the files are
+    read from storage at send time, so the outbox never holds file bytes.
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    entry = EmailOutbox(
+        recipients=json.dumps(list(recipients)),
+        subject=subject,
+        body_text=body,
+        body_html=html,
+        attachments=json.dumps([
+            {
+                'key': key,
+                'filename': filename,
+                'content_type': mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            }
+            for key, filename in attachments
+        ]) if attachments else None,
+        campaign=campaign,
+        user_id=user_id
+    )
+    db.session.add(entry)
+    if (current_app.config.get('EMAIL_WORKER') or 'thread') == 'thread':
+        start_worker_thread(current_app._get_current_object())
+    return entry
+
+
+def build_message(entry):
+    message = Message(
+        subject=entry.subject,
+        recipients=entry.recipient_list,
+        body=entry.body_text,
+        html=entry.body_html
+    )
+    if entry.attachments:
+        from app.storage import get_storage
+        storage = get_storage()
+        for attachment in json.loads(entry.attachments):
+            with storage.open(attachment['key']) as f:
+                message.attach(attachment['filename'], attachment['content_type'], f.read())
+    return message
+
+
+class RateLimiter:
+    """Spaces sends evenly so the whole pool stays under ``rate`` messages/second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def claim_batch(limit):
+    """
+    Claim up to ``limit`` due messages for this worker and return them.
+    Rows left in 'sending' by a crashed worker are reclaimed after
+    EMAIL_OUTBOX_LOCK_TIMEOUT seconds.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config.get('EMAIL_OUTBOX_LOCK_TIMEOUT', 300))
+    due = or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at < stale)
+    )
+    candidates = db.session.query(EmailOutbox.id, EmailOutbox.status)\
+        .filter(due)\
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)\
+        .limit(limit).all()
+
+    claimed = []
+    for entry_id, status in candidates:
+        # Only one worker can move a row out of the state it just saw
+        updated = EmailOutbox.query.filter(
+            EmailOutbox.id == entry_id,
+            EmailOutbox.status == status,
+            due
+        ).update({'status': 'sending', 'locked_at': now}, synchronize_session=False)
+        if updated:
+            claimed.append(entry_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try: base * 2^(attempts-1), capped"""
+    base = current_app.config.get('EMAIL_OUTBOX_BACKOFF', 30)
+    cap = current_app.config.get('EMAIL_OUTBOX_MAX_BACKOFF', 3600)
+    return min(base * 2 ** max(attempts - 1, 0), cap)
+
+
+def record_failure(entry, error):
+    entry.attempts += 1
+    entry.last_error = str(error)[:1000]
+    entry.locked_at = None
+    if entry.attempts >= current_app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 6):
+        entry.status = 'failed'
+        logger.error("Giving up on email %s to %s: %s", entry.id, entry.recipients, error)
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(entry.attempts))
+        logger.warning("Email %s failed (attempt %s), retrying: %s", entry.id, entry.attempts, error)
+
+
+def record_sent(entry):
+    entry.status = 'sent'
+    entry.sent_at = datetime.utcnow()
+    entry.locked_at = None
+    entry.last_error = None
+
+
+class OutboxWorker:
+    """Drains the outbox over a single reused SMTP connection"""
+
+    def __init__(self, app, batch_size=None, poll_interval=None, idle_timeout=None, limiter=None, wakeup=None):
+        self.app = app
+        self.limiter = limiter or RateLimiter(app.config.get('EMAIL_RATE_LIMIT', 0))
+        self.batch_size = batch_size or app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 50)
+        self.poll_interval = poll_interval or app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 2)
+        self.idle_timeout = idle_timeout or app.config.get('EMAIL_SMTP_IDLE_TIMEOUT', 60)
+        self.wakeup = wakeup or threading.Event()
+        self.stopping = threading.Event()
+        self._connection = None
+        self._last_used = 0
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = mail.connect().__enter__()
+        self._last_used = time.monotonic()
+        return self._connection
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass  # the server may already have dropped us
+
+    def _send(self, message):
+        reused = self._connection is not None
+        try:
+            self._connect().send(message)
+        except CONNECTION_ERRORS:
+            self.close()
+            if not reused:
+                raise
+            # The pooled connection went stale while idle; retry once on a fresh one
+            self._connect().send(message)
+
+    def run_once(self):
+        """Send one batch. Returns the number of messages claimed."""
+        with self.app.app_context():
+            batch = claim_batch(self.batch_size)
+            for entry in batch:
+                try:
+                    message = build_message(entry)
+                    self.limiter.wait()
+                    self._send(message)
+                    record_sent(entry)
+                except CONNECTION_ERRORS as e:
+                    self.close()
+                    record_failure(entry, e)
+                except Exception as e:
+                    record_failure(entry, e)
+                # Commit per message so a crash never causes a resend of delivered mail
+                db.session.commit()
+            db.session.remove()
+            return len(batch)
+
+    def run(self):
+        logger.info("Email outbox worker started")
+        while not self.stopping.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("Email outbox worker error")
+                self.close()
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more work is probably waiting
+            if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self.close()
+            if self.wakeup.wait(self.poll_interval):
+                # Give every worker in the pool a chance to see the wakeup
+                time.sleep(0.05)
+                self.wakeup.clear()
+        self.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+
+class OutboxPool:
+    """A few OutboxWorkers, each with its own long-lived SMTP connection"""
+
+    def __init__(self, app, size=None, batch_size=None):
+        size = size or app.config.get('EMAIL_SMTP_CONNECTIONS', 1)
+        self.wakeup = threading.Event()
+        limiter = RateLimiter(app.config.get('EMAIL_RATE_LIMIT', 0))
+        self.workers = [
+            OutboxWorker(app, batch_size=batch_size, limiter=limiter, wakeup=self.wakeup)
+            for _ in range(max(1, size))
+        ]
+        self.threads = []
+
+    def start(self):
+        for i, worker in enumerate(self.workers):
+            thread = threading.Thread(target=worker.run, name=f'email-outbox-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def join(self):
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+_thread_lock = threading.Lock()
+
+
+def start_worker_thread(app):
+    """Start the in-process worker pool once per app and nudge it to look for new mail"""
+    pool = app.extensions.get('email_outbox_worker')
+    if pool is None:
+        with _thread_lock:
+            pool = app.extensions.get('email_outbox_worker')
+            if pool is None:
+                pool = OutboxPool(app).start()
+                app.extensions['email_outbox_worker'] = pool
+    pool.wakeup.set()
+    return pool
+
+
+def campaign_status(campaign, user_id=None):
+    """Count of messages per status for one bulk send"""
+    query = db.session.query(EmailOutbox.status, db.func.count(EmailOutbox.id))\
+        .filter(EmailOutbox.campaign == campaign)
+    if user_id is not None:
+        query = query.filter(EmailOutbox.user_id == user_id)
+    return dict(query.group_by(EmailOutbox.status).all())
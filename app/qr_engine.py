@@ -0,0 +1,282 @@
+"""
+QR code rendering with a single encode path and an in-process LRU cache
+
+Every QR code is encoded exactly once; the same bytes feed the inline data
+URI and storage. Encoded images are cached by their full rendering spec and
+output format, so regenerating the same code skips matrix construction and
+encoding.
+
+Branded codes (custom colors, centered logo) use error correction level H so
+the logo can cover part of the symbol. Uploaded logos are kept in storage
+under their content hash; the decoded image and each resized overlay are
+cached separately, so a styled code with a known logo costs about the same
+as a plain one.
+"""
+import base64
+from collections import namedtuple
+from io import BytesIO
+import qrcode
+from flask import current_app
+from app.lru import LRUCache
+
+QRSpec = namedtuple('QRSpec', [
+    'data', 'version', 'box_size', 'border', 'fill_color', 'back_color', 'error_correction', 'logo'
+])
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Logo width as a fraction of the symbol; with level H this stays well
+# inside the recoverable area
+LOGO_RATIO = 0.22
+# Overlay resolution used for the vector formats
+VECTOR_OVERLAY_PX = 256
+
+
+def normalize_color(color):
+    """
+    Lowercase hex colors, mapping plain black/white back to the names so
+    unstyled codes keep the compact 1-bit PNG encoding
+    """
+    color = (color or '').strip().lower()
+    return {'#000000': 'black', '#ffffff': 'white'}.get(color, color)
+
+
+def make_spec(data, version=1, box_size=10, border=5, fill_color='black', back_color='white',
+              error_correction='M', logo=None):
+    """``logo`` is the storage key of an uploaded logo image, if any"""
+    return QRSpec(data, version, box_size, border, fill_color, back_color, error_correction, logo)
+
+
+# Output format -> mimetype
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+}
+
+
+def _build(spec):
+    qr = qrcode.QRCode(version=spec.version, box_size=spec.box_size, border=spec.border,
+                       error_correction=ERROR_CORRECTION[spec.error_correction])
+    qr.add_data(spec.data)
+    qr.make(fit=True)
+    return qr
+
+
+def _image_size(image):
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+def _cache_sizeof(value):
+    return len(value) if isinstance(value, bytes) else _image_size(value)
+
+
+def load_logo(key):
+    """Decoded RGBA logo for a storage key, cached after the first decode"""
+    from PIL import Image
+    from app.storage import get_storage
+
+    cache = current_app.extensions['qr_logo_cache']
+    logo = cache.get(key)
+    if logo is None:
+        with get_storage().open(key) as f:
+            logo = Image.open(BytesIO(f.read())).convert('RGBA')
+        cache.set(key, logo)
+    return logo
+
+
+def logo_overlay(key, size, back_color):
+    """
+    Logo resized to fit a ``size`` px square on a padded background tile,
+    cached per (logo, size, background) so compositing is a single paste.
+    """
+    from PIL import Image
+
+    cache = current_app.extensions['qr_logo_cache']
+    cache_key = ('overlay', key, size, back_color)
+    overlay = cache.get(cache_key)
+    if overlay is None:
+        logo = load_logo(key).copy()
+        padding = max(2, size // 12)
+        logo.thumbnail((size - 2 * padding, size - 2 * padding), Image.LANCZOS)
+        overlay = Image.new('RGBA', (size, size), back_color)
+        overlay.alpha_composite(logo, ((size - logo.width) // 2, (size - logo.height) // 2))
+        cache.set(cache_key, overlay)
+    return overlay
+
+
+def overlay_png(key, back_color):
+    """PNG bytes of the overlay tile, for embedding in vector output"""
+    cache = current_app.extensions['qr_logo_cache']
+    cache_key = ('overlay_png', key, back_color)
+    data = cache.get(cache_key)
+    if data is None:
+        buffer = BytesIO()
+        logo_overlay(key, VECTOR_OVERLAY_PX, back_color).save(buffer, format='PNG')
+        data = buffer.getvalue()
+        cache.set(cache_key, data)
+    return data
+
+
+def encode_png(spec):
+    """Build the QR matrix and encode it to PNG bytes (no caching)"""
+    img = _build(spec).make_image(fill_color=spec.fill_color, back_color=spec.back_color)
+    if spec.logo:
+        img = img.get_image().convert('RGB')
+        overlay = logo_overlay(spec.logo, int(img.width * LOGO_RATIO), _css_color(spec.back_color))
+        img.paste(overlay, ((img.width - overlay.width) // 2, (img.height - overlay.height) // 2), overlay)
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _dark_runs(matrix):
+    """Yield (row, start column, length) for each horizontal run of dark modules"""
+    for row, line in enumerate(matrix):
+        col, width = 0, len(line)
+        while col < width:
+            if line[col]:
+                start = col
+                while col < width and line[col]:
+                    col += 1
+                yield row, start, col - start
+            else:
+                col += 1
+
+
+def _css_color(color):
+    if isinstance(color, (tuple, list)):
+        return '#%02x%02x%02x' % tuple(color[:3])
+    return color
+
+
+def encode_svg(spec):
+    """
+    Encode the QR matrix as a compact SVG: one path in module units with
+    horizontal runs merged, scaled by width/height. No rasterization.
+    """
+    matrix = _build(spec).get_matrix()  # includes the quiet zone border
+    modules = len(matrix)
+    size = modules * spec.box_size
+    path = ''.join(f"M{x} {y}h{w}v1h-{w}z" for y, x, w in _dark_runs(matrix))
+    logo = ''
+    if spec.logo:
+        png = base64.b64encode(overlay_png(spec.logo, _css_color(spec.back_color))).decode('ascii')
+        extent = round(modules * LOGO_RATIO, 3)
+        offset = round((modules - extent) / 2, 3)
+        logo = (f'<image x="{offset}" y="{offset}" width="{extent}" height="{extent}" '
+                f'href="data:image/png;base64,{png}"/>')
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {modules} {modules}" '
+        f'width="{size}" height="{size}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="{_css_color(spec.back_color)}"/>'
+        f'<path fill="{_css_color(spec.fill_color)}" d="{path}"/>{logo}</svg>'
+    )
+    return svg.encode('utf-8')
+
+
+def encode_pdf(spec):
+    """
+    Draw the QR matrix as vector rectangles on a one-page PDF. Horizontal
+    runs of dark modules are merged, so the file stays small and prints
+    sharply at any size.
+    """
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+
+    matrix = _build(spec).get_matrix()  # includes the quiet zone border
+    modules = len(matrix)
+    box = spec.box_size
+    size = modules * box
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(size, size), pageCompression=1)
+    pdf.setFillColor(colors.toColor(_css_color(spec.back_color)))
+    pdf.rect(0, 0, size, size, stroke=0, fill=1)
+    pdf.setFillColor(colors.toColor(_css_color(spec.fill_color)))
+    path = pdf.beginPath()
+    for y, x, w in _dark_runs(matrix):
+        path.rect(x * box, size - (y + 1) * box, w * box, box)
+    pdf.drawPath(path, stroke=0, fill=1)
+    if spec.logo:
+        from reportlab.lib.utils import ImageReader
+        overlay = logo_overlay(spec.logo, VECTOR_OVERLAY_PX, _css_color(spec.back_color))
+        extent = size * LOGO_RATIO
+        pdf.drawImage(ImageReader(overlay), (size - extent) / 2, (size - extent) / 2, extent, extent)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def encode(spec, fmt='png'):
+    if fmt == 'png':
+        return encode_png(spec)
+    if fmt == 'svg':
+        return encode_svg(spec)
+    if fmt == 'pdf':
+        return encode_pdf(spec)
+    raise ValueError(f"Unsupported QR format: {fmt}")
+
+
+def encode_job(job):
+    """Picklable entry point for worker pools: job is (spec, fmt)"""
+    return encode(*job)
+
+
+def render(spec, fmt='png'):
+    """Encoded bytes for a spec, served from the app's QR cache when possible"""
+    cache = current_app.extensions.get('qr_cache')
+    if cache is None:
+        return encode(spec, fmt)
+    key = (spec, fmt)
+    data = cache.get(key)
+    if data is None:
+        data = encode(spec, fmt)
+        cache.set(key, data)
+    return data
+
+
+def render_png(spec):
+    return render(spec, 'png')
+
+
+def data_uri(data, fmt='png'):
+    return f"data:{FORMATS[fmt]};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def save_logo(data):
+    """
+    Validate an uploaded logo and keep it in storage. Returns the storage
+    key, which is what QR specs (and therefore the caches) refer to.
+    """
+    from PIL import Image
+    from app.storage import get_storage
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            fmt = img.format
+            img.verify()
+    except Exception:
+        fmt = None
+    if fmt not in ('PNG', 'JPEG'):
+        raise ValueError('The logo must be a PNG or JPEG image')
+    return get_storage().save(data, 'logos', 'png' if fmt == 'PNG' else 'jpg').key
+
+
+def init_qr_engine(app):
+    app.extensions['qr_cache'] = LRUCache(
+        max_entries=app.config.get('QR_CACHE_MAX_ENTRIES', 1024),
+        max_bytes=app.config.get('QR_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+    )
+    # Decoded logos and resized overlays (PIL images and small PNGs)
+    app.extensions['qr_logo_cache'] = LRUCache(
+        max_entries=app.config.get('QR_LOGO_CACHE_MAX_ENTRIES', 256),
+        max_bytes=app.config.get('QR_LOGO_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        sizeof=_cache_sizeof
+    )
+    return app.extensions['qr_cache']
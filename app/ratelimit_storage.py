@@ -0,0 +1,413 @@
+"""
+Shared rate limit storage for Flask-Limiter
+
+With the default memory:// storage every worker process keeps its own
+counters, so the configured limits are multiplied by the number of workers
+and forgotten on restart. The storages here are shared by all workers:
+
+    sqlite:///path/to/ratelimit.db   one SQLite file in WAL mode, for all
+                                     workers on one machine (the default)
+    resp://host:6379/0               any server speaking the Redis protocol
+                                     (Redis, Valkey, KeyDB or a local
+                                     stand-in); needs only GET, SET NX PX,
+                                     INCRBY, DECRBY, PTTL and DEL, no Lua
+    redis://...                      still handled by limits' own RedisStorage
+                                     (needs the optional ``redis`` package)
+
+Both implement the sliding window counter strategy (RATELIMIT_STRATEGY =
+"sliding-window-counter"): each limit keeps a counter for the current and
+the previous fixed window, and a hit is allowed if
+
+    previous * (time left of the previous window / window) + current < limit
+
+Two integers per key instead of a timestamp per hit, with no burst at
+window boundaries. Increments are atomic: SQLite does the check and the
+increment in one IMMEDIATE transaction, the Redis protocol storage
+increments first with INCRBY and gives the hit back with DECRBY if it went
+over, so concurrent workers can never admit more than the limit.
+
+They also hold token buckets for the per-user plan limits (see
+app/user_ratelimit.py), stored in GCRA form: one "theoretical arrival
+time" per bucket instead of a token count and a timestamp, updated with
+the same atomicity guarantees (an IMMEDIATE transaction, or WATCH/MULTI on
+the Redis protocol). MemoryTokenBuckets is the per-process fallback.
+
+Importing this module registers the schemes with ``limits``.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from math import floor
+from urllib.parse import urlparse
+from limits.storage import Storage, SlidingWindowCounterSupport
+from limits.storage.base import TimestampedSlidingWindow
+
+# Expired rows are deleted every this many writes (per process)
+SQLITE_PURGE_EVERY = 1000
+
+
+def sliding_window_info(previous_count, current_count, expiry, now):
+    """(previous_count, previous_ttl, current_count, current_ttl) as limits expects"""
+    if previous_count:
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+    else:
+        previous_ttl = 0.0
+    current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+    return previous_count, previous_ttl, current_count, current_ttl
+
+
+def weighted_count(previous_count, previous_ttl, current_count, expiry):
+    return previous_count * previous_ttl / expiry + current_count
+
+
+TokenResult = namedtuple('TokenResult', ['allowed', 'remaining', 'reset_after', 'retry_after'])
+
+
+def gcra(tat, now, rate, capacity, cost=1):
+    """
+    Token bucket of ``capacity`` tokens refilled at ``rate`` tokens/second,
+    as the generic cell rate algorithm. ``tat`` is the stored theoretical
+    arrival time (None for a full bucket). Returns (TokenResult, new tat);
+    the new tat is None when nothing has to be stored.
+    """
+    interval = 1.0 / rate
+    window = capacity * interval
+    tat = max(tat or now, now)
+    new_tat = tat + cost * interval
+    if new_tat - now > window:
+        remaining = max(0, int((window - (tat - now)) / interval))
+        return TokenResult(False, remaining, tat - now, new_tat - now - window), None
+    remaining = int((window - (new_tat - now)) / interval + 1e-9)
+    return TokenResult(True, remaining, new_tat - now, 0.0), (new_tat if cost else None)
+
+
+class MemoryTokenBuckets:
+    """Per-process token buckets, used with memory:// or when the shared storage is down"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire_token(self, key, rate, capacity, cost=1):
+        now = time.time()
+        with self._lock:
+            result, new_tat = gcra(self._tats.get(key), now, rate, capacity, cost)
+            if new_tat is not None:
+                self._tats[key] = new_tat
+                self._tats.move_to_end(key)
+                if len(self._tats) > self.max_keys:
+                    self._tats.popitem(last=False)
+        return result
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Counters in a WAL-mode SQLite file shared by every local worker"""
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, timeout=5.0, **options):
+        # Same convention as SQLAlchemy: sqlite:///relative.db, sqlite:////absolute.db
+        self.path = uri.split('://', 1)[1][1:] if uri else 'ratelimit.db'
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        self._increments = 0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit (
+                    key TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_bucket (
+                    key TEXT PRIMARY KEY,
+                    tat REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        """One connection per thread, reopened after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _incr(self, conn, key, expiry, amount, now):
+        # A single UPSERT: restarts the counter if it expired, adds to it otherwise
+        row = conn.execute("""
+            INSERT INTO rate_limit (key, count, expires_at) VALUES (:key, :amount, :expires_at)
+            ON CONFLICT(key) DO UPDATE SET
+                count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+                expires_at = CASE WHEN expires_at <= :now THEN :expires_at ELSE expires_at END
+            RETURNING count
+        """, {'key': key, 'amount': amount, 'expires_at': now + expiry, 'now': now}).fetchone()
+        self._maybe_purge(conn, now)
+        return row[0]
+
+    def _maybe_purge(self, conn, now):
+        self._increments += 1
+        if self._increments % SQLITE_PURGE_EVERY == 0:
+            conn.execute('DELETE FROM rate_limit WHERE expires_at <= ?', (now,))
+            # A bucket whose tat has passed is full again, the same as no row
+            conn.execute('DELETE FROM token_bucket WHERE tat <= ?', (now,))
+
+    def _get(self, conn, key, now):
+        row = conn.execute('SELECT count FROM rate_limit WHERE key = ? AND expires_at > ?',
+                           (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key, expiry, amount=1):
+        return self._incr(self._connect(), key, expiry, amount, time.time())
+
+    def get(self, key):
+        return self._get(self._connect(), key, time.time())
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connect().execute('SELECT expires_at FROM rate_limit WHERE key = ? AND expires_at > ?',
+                                      (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connect().execute('DELETE FROM rate_limit').rowcount
+
+    def clear(self, key):
+        self._connect().execute('DELETE FROM rate_limit WHERE key = ?', (key,))
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        conn = self._connect()
+        # The write lock is taken up front, so the check and the increment
+        # are one step for every process sharing the file
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            previous, previous_ttl, current, _ = sliding_window_info(
+                self._get(conn, previous_key, now), self._get(conn, current_key, now), expiry, now)
+            allowed = floor(weighted_count(previous, previous_ttl, current, expiry)) + amount <= limit
+            if allowed:
+                # Twice the window, so it is still there while it is the previous window
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def acquire_token(self, key, rate, capacity, cost=1):
+        conn = self._connect()
+        if not cost:
+            row = conn.execute('SELECT tat FROM token_bucket WHERE key = ?', (key,)).fetchone()
+            return gcra(row[0] if row else None, time.time(), rate, capacity, 0)[0]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tat FROM token_bucket WHERE key = ?', (key,)).fetchone()
+            result, new_tat = gcra(row[0] if row else None, now, rate, capacity, cost)
+            if new_tat is not None:
+                conn.execute('INSERT INTO token_bucket (key, tat) VALUES (?, ?) '
+                             'ON CONFLICT(key) DO UPDATE SET tat = excluded.tat', (key, new_tat))
+                self._maybe_purge(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        conn = self._connect()
+        return sliding_window_info(self._get(conn, previous_key, now), self._get(conn, current_key, now),
+                                   expiry, now)
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._connect().execute('DELETE FROM rate_limit WHERE key IN (?, ?)', (previous_key, current_key))
+
+
+class RESPError(Exception):
+    """Error reply from a Redis protocol server"""
+
+
+class RESPConnection:
+    """Minimal blocking RESP2 client: send one command, read one reply"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.command('AUTH', password)
+        if db:
+            self.command('SELECT', db)
+
+    def command(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self.sock.sendall(b''.join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, value = line[:1], line[1:-2]
+        if kind == b'+':
+            return value.decode()
+        if kind == b'-':
+            raise RESPError(value.decode())
+        if kind == b':':
+            return int(value)
+        if kind == b'$':
+            length = int(value)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(value)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RESPError(f'unexpected reply {line!r}')
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RESPStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Counters on a Redis protocol server, one connection per thread"""
+
+    STORAGE_SCHEME = ['resp']
+
+    def __init__(self, uri=None, wrap_exceptions=False, timeout=1.0, **options):
+        parsed = urlparse(uri or 'resp://localhost:6379/0')
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.strip('/') or 0)
+        self.password = parsed.password
+        self.timeout = float(timeout)
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return (RESPError, OSError)
+
+    def _command(self, *args):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = RESPConnection(self.host, self.port, self.db, self.password, self.timeout)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        try:
+            return conn.command(*args)
+        except (OSError, ConnectionError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+    def incr(self, key, expiry, amount=1):
+        # Create the key with its expiry first so it can never outlive the window
+        self._command('SET', key, 0, 'PX', int(expiry * 1000), 'NX')
+        return self._command('INCRBY', key, amount)
+
+    def decr(self, key, amount=1):
+        return self._command('DECRBY', key, amount)
+
+    def get(self, key):
+        return int(self._command('GET', key) or 0)
+
+    def get_expiry(self, key):
+        ttl = self._command('PTTL', key)
+        return time.time() + max(ttl, 0) / 1000
+
+    def check(self):
+        try:
+            return self._command('PING') == 'PONG'
+        except self.base_exceptions:
+            return False
+
+    def reset(self):
+        # Only used by tests; FLUSHDB would take unrelated keys with it
+        return None
+
+    def clear(self, key):
+        self._command('DEL', key)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous, previous_ttl, current, _ = sliding_window_info(
+            self.get(previous_key), self.get(current_key), expiry, now)
+        if floor(weighted_count(previous, previous_ttl, current, expiry)) + amount > limit:
+            return False
+        # INCRBY is atomic on the server; if another worker got there first
+        # and the window is now over the limit, give the hit back
+        current = self.incr(current_key, 2 * expiry, amount)
+        if floor(weighted_count(previous, previous_ttl, current, expiry)) > limit:
+            self.decr(current_key, amount)
+            return False
+        return True
+
+    def acquire_token(self, key, rate, capacity, cost=1, attempts=5):
+        key = f'tb:{key}'
+        if not cost:
+            tat = self._command('GET', key)
+            return gcra(float(tat) if tat else None, time.time(), rate, capacity, 0)[0]
+        for _ in range(attempts):
+            # Optimistic transaction: EXEC fails if another worker changed the bucket
+            self._command('WATCH', key)
+            tat = self._command('GET', key)
+            now = time.time()
+            result, new_tat = gcra(float(tat) if tat else None, now, rate, capacity, cost)
+            if new_tat is None:
+                self._command('UNWATCH')
+                return result
+            self._command('MULTI')
+            self._command('SET', key, repr(new_tat), 'PX', max(1, int((new_tat - now) * 1000)))
+            if self._command('EXEC') is not None:
+                return result
+        # Heavily contended bucket: refuse rather than spin
+        return TokenResult(False, 0, 0.0, 1.0 / rate)
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        return sliding_window_info(self.get(previous_key), self.get(current_key), expiry, now)
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._command('DEL', previous_key, current_key)
@@ -0,0 +1,242 @@
+"""
+Document generation behind the render gate
+
+The invoice, resume and certificate views build a payload and call
+generate_document(). With a free render slot (see app/admission.py) the PDF
+is rendered, stored and recorded right away and the user is redirected to
+the download. When the gate sheds the request:
+
+    - RENDER_SHED_MODE=defer (the default): the render is handed to a
+      background thread of this process and the user gets 202 Accepted with
+      a polling URL (/render-jobs/<id>) for the RenderJob row; the thread
+      renders once the interactive requests have been served. At most
+      RENDER_DEFERRED_QUEUE_SIZE jobs wait per process, beyond that the
+      request is shed with 503
+    - RENDER_SHED_MODE=reject: 503 Service Unavailable
+
+Both answers carry a Retry-After header. Deferred jobs live in memory; a job
+whose process went away is reported as failed after RENDER_JOB_EXPIRY
+seconds.
+"""
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app, flash, redirect, render_template, request, jsonify, url_for
+from flask_login import current_user
+from app import db
+from app.models import Invoice, Resume, Certificate, RenderJob
+from app.admission import RenderBusy, get_render_gate
+from app.documents import index_document
+from app.downloads import signed_url
+from app.rendering import render_document
+from app.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, storage folder, form endpoint)
+DOCUMENT_MODELS = {
+    'invoice': (Invoice, 'invoices', 'main.invoice'),
+    'resume': (Resume, 'resumes', 'main.resume_builder'),
+    'certificate': (Certificate, 'certificates', 'main.certificate_generator'),
+}
+
+_thread_lock = threading.Lock()
+
+
+def store_document(kind, pdf_bytes, user_id, fields):
+    """Save a rendered PDF and its record; returns the storage key"""
+    model, folder, _endpoint = DOCUMENT_MODELS[kind]
+    stored = get_storage().save(pdf_bytes, folder, 'pdf')
+    record = model(user_id=user_id, pdf_path=stored.key, **fields)
+    db.session.add(record)
+    db.session.flush()
+    index_document(kind, record, path=stored.key, size=stored.size)
+    db.session.commit()
+    return stored.key
+
+
+class DeferredRenders:
+    """Background thread rendering the jobs shed from web requests"""
+
+    def __init__(self, app, max_jobs):
+        self.app = app
+        self.jobs = queue.Queue(maxsize=max_jobs)
+        self.thread = None
+        self.submitted = 0
+        self.refused = 0
+        self.failed = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='deferred-renders', daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, job_id, kind, payload, template_id, fields):
+        """False when the queue is full"""
+        try:
+            self.jobs.put_nowait((job_id, kind, payload, template_id, fields))
+        except queue.Full:
+            self.refused += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self.app.app_context():
+                try:
+                    self._render(*job)
+                except Exception:
+                    logger.exception("Deferred render %s failed", job[0])
+                finally:
+                    db.session.remove()
+
+    def _render(self, job_id, kind, payload, template_id, fields):
+        job = db.session.get(RenderJob, job_id)
+        if job is None:
+            return
+        try:
+            with get_render_gate().slot(deferred=True):
+                job.status = 'running'
+                db.session.commit()
+                pdf_bytes = render_document(kind, payload, template_id)
+            job.file_key = store_document(kind, pdf_bytes, job.user_id, fields)
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Deferred %s render %s failed: %s", kind, job_id, e)
+            self.failed += 1
+            job = db.session.get(RenderJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def get_deferred_renders(app):
+    """The deferred render thread of this process, started on first use"""
+    deferred = app.extensions.get('deferred_renders')
+    if deferred is None:
+        with _thread_lock:
+            deferred = app.extensions.get('deferred_renders')
+            if deferred is None:
+                deferred = DeferredRenders(app, app.config.get('RENDER_DEFERRED_QUEUE_SIZE', 32)).start()
+                app.extensions['deferred_renders'] = deferred
+    return deferred
+
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+def job_pending_response(job, retry_after):
+    poll_url = url_for('main.render_job', job_id=job.id)
+    headers = {'Retry-After': str(retry_after), 'Location': poll_url}
+    if wants_json():
+        return jsonify({'id': job.id, 'status': job.status, 'poll_url': poll_url}), 202, headers
+    return render_template('render_job.html', job=job, poll_url=poll_url, retry_after=retry_after), 202, headers
+
+
+def busy_response(retry_after):
+    headers = {'Retry-After': str(retry_after)}
+    if wants_json():
+        return jsonify({'error': 'busy', 'retry_after': retry_after}), 503, headers
+    return render_template('errors/503.html'), 503, headers
+
+
+def generate_document(kind, payload, template_id, fields, download_name, message):
+    """
+    Render, store and record a document for the current user, or shed the
+    request (see the module docstring). Returns the response for the view.
+    """
+    gate = get_render_gate()
+    try:
+        with gate.slot():
+            pdf_bytes = render_document(kind, payload, template_id)
+    except RenderBusy as busy:
+        return shed_document(kind, payload, template_id, fields, download_name, busy.retry_after)
+
+    key = store_document(kind, pdf_bytes, current_user.id, fields)
+    flash(message, 'success')
+    return redirect(signed_url(key, download_name))
+
+
+def shed_document(kind, payload, template_id, fields, download_name, retry_after):
+    app = current_app._get_current_object()
+    if app.config.get('RENDER_SHED_MODE', 'defer') != 'defer':
+        return busy_response(retry_after)
+
+    job = RenderJob(id=uuid.uuid4().hex, user_id=current_user.id, kind=kind,
+                    status='queued', download_name=download_name)
+    db.session.add(job)
+    db.session.commit()
+    if not get_deferred_renders(app).submit(job.id, kind, payload, template_id, fields):
+        db.session.delete(job)
+        db.session.commit()
+        return busy_response(retry_after)
+    return job_pending_response(job, retry_after)
+
+
+def job_status_response(job):
+    """Response for the polling URL of one of the current user's jobs"""
+    if job.status in ('queued', 'running'):
+        expiry = current_app.config.get('RENDER_JOB_EXPIRY', 600)
+        if job.created_at < datetime.utcnow() - timedelta(seconds=expiry):
+            job.status = 'failed'
+            job.error = 'The document was not generated in time'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        else:
+            return job_pending_response(job, get_render_gate().retry_after())
+
+    if job.status == 'done':
+        download_url = signed_url(job.file_key, job.download_name)
+        if wants_json():
+            return jsonify({'id': job.id, 'status': job.status, 'download_url': download_url})
+        flash(f'{job.kind.capitalize()} generated successfully!', 'success')
+        return redirect(download_url)
+
+    if wants_json():
+        return jsonify({'id': job.id, 'status': job.status, 'error': job.error})
+    flash(f'Error generating {job.kind}: {job.error}', 'danger')
+    return redirect(url_for(DOCUMENT_MODELS[job.kind][2]))
+
+
+def render_metrics(app):
+    """Render gate and deferred render counters in Prometheus text format"""
+    gate = app.extensions['render_gate'].snapshot()
+    deferred = app.extensions.get('deferred_renders')
+    series = [
+        ('render_concurrency_limit', 'gauge', 'Renders allowed to run at once', gate['max_concurrency']),
+        ('render_queue_limit', 'gauge', 'Requests allowed to wait for a render slot', gate['queue_size']),
+        ('render_in_flight', 'gauge', 'Renders running now', gate['in_flight']),
+        ('render_queue_depth', 'gauge', 'Requests waiting for a render slot', gate['waiting']),
+        ('render_admitted_total', 'counter', 'Renders given a slot', gate['admitted']),
+        ('render_queued_total', 'counter', 'Requests that had to wait for a slot', gate['queued']),
+        ('render_rejected_total', 'counter', 'Requests shed by the render gate', gate['rejected']),
+        ('render_queue_timeouts_total', 'counter', 'Requests shed after waiting the full queue timeout',
+         gate['timed_out']),
+        ('render_completed_total', 'counter', 'Renders finished (including failures)', gate['completed']),
+        ('render_wait_seconds_total', 'counter', 'Time spent waiting for render slots', gate['wait_seconds']),
+        ('render_seconds_total', 'counter', 'Time spent holding render slots', gate['render_seconds']),
+        ('render_deferred_queue_depth', 'gauge', 'Deferred renders not started yet',
+         deferred.jobs.qsize() if deferred else 0),
+        ('render_deferred_waiting', 'gauge', 'Deferred renders waiting for a slot', gate['waiting_deferred']),
+        ('render_deferred_total', 'counter', 'Shed requests answered with 202 and rendered later',
+         deferred.submitted if deferred else 0),
+        ('render_deferred_refused_total', 'counter', 'Shed requests refused because the deferred queue was full',
+         deferred.refused if deferred else 0),
+        ('render_deferred_failed_total', 'counter', 'Deferred renders that failed',
+         deferred.failed if deferred else 0),
+    ]
+    pid = os.getpid()
+    lines = []
+    for name, metric_type, description, value in series:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f'{name}{{pid="{pid}"}} {value}')
+    return '\n'.join(lines) + '\n'
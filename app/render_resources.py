@@ -0,0 +1,174 @@
+"""
+Process-wide resources shared by every PDF render
+
+    fonts           TrueType fonts registered with ReportLab once per
+                    process. The first candidate with a ₹ glyph
+                    (RENDER_FONT_REGULAR/RENDER_FONT_BOLD, else common
+                    system locations) becomes the 'DocSans' family used for
+                    amounts; without one, amounts fall back to Helvetica
+                    and "Rs."
+    stylesheet      ReportLab's sample stylesheet, built once and used only
+                    as the parent of the compiled template styles
+    images          decoded ImageReaders (the invoice logo) in a bounded LRU
+                    keyed by (path, mtime), so a replaced file is reloaded
+
+init_render_resources() loads all of it, and compiles the built-in
+templates, at startup so the first request pays nothing. Everything here is
+read-only once built and safe to share between threads.
+"""
+import logging
+import os
+import threading
+from collections import namedtuple
+from PIL import Image as PILImage
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Flowable
+from app.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+RUPEE = '\u20b9'
+
+# The invoice logo is drawn 1.2in wide; 300px keeps it sharp at 250dpi
+LOGO_MAX_PX = 300
+
+# (regular, bold) TTF candidates, tried in order
+FONT_CANDIDATES = (
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/dejavu/DejaVuSans.ttf', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/TTF/DejaVuSans.ttf', '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf', '/usr/share/fonts/truetype/noto/NotoSans-Bold.ttf'),
+    ('/usr/share/fonts/noto/NotoSans-Regular.ttf', '/usr/share/fonts/noto/NotoSans-Bold.ttf'),
+    ('/Library/Fonts/Arial Unicode.ttf', None),
+    ('C:/Windows/Fonts/Nirmala.ttf', 'C:/Windows/Fonts/NirmalaB.ttf'),
+)
+
+FontSet = namedtuple('FontSet', ['regular', 'bold', 'currency'])
+
+BASE_FONTS = FontSet('Helvetica', 'Helvetica-Bold', 'Rs. ')
+
+_lock = threading.Lock()
+_fonts = None
+_stylesheet = None
+_images = LRUCache(max_entries=32)
+
+
+def _has_glyph(font, char):
+    return ord(char) in font.face.charToGlyph
+
+
+def register_fonts(candidates=FONT_CANDIDATES):
+    """
+    Register the first usable TTF pair as 'DocSans' / 'DocSans-Bold'.
+    Runs once per process; returns the FontSet for amounts.
+    """
+    global _fonts
+    with _lock:
+        if _fonts is not None:
+            return _fonts
+        fonts = BASE_FONTS
+        for regular_path, bold_path in candidates:
+            if not regular_path or not os.path.exists(regular_path):
+                continue
+            try:
+                regular = TTFont('DocSans', regular_path)
+                if not _has_glyph(regular, RUPEE):
+                    continue
+                bold = regular
+                if bold_path and os.path.exists(bold_path):
+                    bold = TTFont('DocSans-Bold', bold_path)
+                    if not _has_glyph(bold, RUPEE):
+                        bold = regular
+            except Exception:
+                logger.warning("Could not load font %s", regular_path, exc_info=True)
+                continue
+            pdfmetrics.registerFont(regular)
+            bold_name = 'DocSans'
+            if bold is not regular:
+                pdfmetrics.registerFont(bold)
+                bold_name = 'DocSans-Bold'
+            pdfmetrics.registerFontFamily('DocSans', normal='DocSans', bold=bold_name,
+                                          italic='DocSans', boldItalic=bold_name)
+            fonts = FontSet('DocSans', bold_name, RUPEE)
+            logger.info("Registered %s for document amounts", regular_path)
+            break
+        _fonts = fonts
+        return _fonts
+
+
+def document_fonts():
+    """The FontSet of this process (registering the defaults on first use)"""
+    return _fonts if _fonts is not None else register_fonts()
+
+
+def base_stylesheet():
+    global _stylesheet
+    if _stylesheet is None:
+        _stylesheet = getSampleStyleSheet()
+    return _stylesheet
+
+
+def image_reader(path, max_px=None):
+    """
+    A decoded ImageReader for an image file, or None if it cannot be read.
+    ``max_px`` shrinks larger images once here: ReportLab compresses the
+    full bitmap into every document that draws it.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    key = (path, mtime, max_px)
+    reader = _images.get(key)
+    if reader is None:
+        try:
+            with PILImage.open(path) as image:
+                image.load()
+                if max_px and max(image.size) > max_px:
+                    image.thumbnail((max_px, max_px))
+                reader = ImageReader(image.copy())
+            reader.getRGBData()  # decode now, not inside a shared render
+        except (OSError, IOError, ValueError):
+            logger.warning("Could not read image %s", path)
+            return None
+        _images.set(key, reader)
+    return reader
+
+
+class CachedImage(Flowable):
+    """Draws a shared ImageReader at a fixed size"""
+
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto')
+
+
+def init_render_resources(app):
+    global _images
+    font_regular = app.config.get('RENDER_FONT_REGULAR')
+    candidates = FONT_CANDIDATES
+    if font_regular:
+        candidates = ((font_regular, app.config.get('RENDER_FONT_BOLD')),) + FONT_CANDIDATES
+    register_fonts(candidates)
+    base_stylesheet()
+    cache_size = app.config.get('RENDER_IMAGE_CACHE_SIZE', 32)
+    if cache_size != _images.max_entries:
+        _images = LRUCache(max_entries=cache_size)
+    image_reader(os.path.join(app.root_path, 'static', 'logo.png'), LOGO_MAX_PX)
+
+    # Pre-build the styles of the built-in templates
+    from app.rendering import DOCUMENT_KINDS, compiled_template
+    for kind in DOCUMENT_KINDS:
+        compiled_template(kind)
+    return document_fonts()
@@ -0,0 +1,271 @@
+"""
+Out-of-process render service
+
+Building a PDF is CPU-bound Python: doc.build holds the GIL of the web
+worker for the whole render. With RENDER_SERVICE=external the web workers
+hand invoice, resume and certificate renders to a pool of warm render
+processes (``python run_render_service.py``):
+
+    - the service loads ReportLab, registers the fonts and compiles the
+      built-in templates once, then forks RENDER_SERVICE_WORKERS children
+      that inherit all of it and accept connections on one listening
+      socket (RENDER_SERVICE_ADDRESS: a Unix socket path or host:port);
+      children that die are replaced, and each one is recycled after
+      RENDER_SERVICE_MAX_REQUESTS renders
+    - connections are authenticated with multiprocessing's HMAC challenge,
+      keyed by RENDER_SERVICE_AUTHKEY. Requests are pickles, so the key is
+      all that stands between the socket and code execution: a host:port
+      address requires an explicit RENDER_SERVICE_AUTHKEY, and a Unix
+      socket (readable by its owner only) may derive the key from
+      SECRET_KEY if that is not the shipped default
+    - a request carries the payload and the template data resolved in the
+      web process, so render workers never touch the database
+    - the web side waits at most RENDER_SERVICE_TIMEOUT seconds (queueing
+      for a free worker included) and raises RenderTimeout after that
+    - when the service cannot be reached, renders fall back to the web
+      process and the service is tried again after RENDER_SERVICE_RETRY
+      seconds
+
+A web thread waiting on the socket does not hold the GIL, so the other
+threads of the worker keep serving requests while the PDF is built.
+"""
+import hashlib
+import logging
+import os
+import signal
+import socket
+import time
+import multiprocessing
+from multiprocessing.connection import (
+    Connection, Listener, AuthenticationError, answer_challenge, deliver_challenge, wait
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RenderServiceUnavailable(Exception):
+    pass
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+class RenderError(Exception):
+    """The render itself failed in the service (bad input, not the transport)"""
+
+
+class RenderServiceConfigError(Exception):
+    """The service cannot be run safely with the current settings"""
+
+
+# SECRET_KEY when none is configured (config.py); public, so never a key
+DEFAULT_SECRET_KEY = 'defaultsecret'
+
+
+def parse_address(address):
+    """'host:port' -> (host, port) for TCP, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+def service_authkey(config, address=None):
+    """
+    The HMAC key for the service at ``address`` (default
+    RENDER_SERVICE_ADDRESS). Raises RenderServiceConfigError when no key
+    that outsiders cannot guess is available.
+    """
+    key = config.get('RENDER_SERVICE_AUTHKEY')
+    if key:
+        return key.encode()
+    address = address or config.get('RENDER_SERVICE_ADDRESS')
+    if isinstance(parse_address(address), tuple):
+        raise RenderServiceConfigError(
+            f"RENDER_SERVICE_AUTHKEY must be set to serve renders on the TCP address {address}")
+    secret = config.get('SECRET_KEY')
+    if not secret or secret == DEFAULT_SECRET_KEY:
+        raise RenderServiceConfigError(
+            "Set RENDER_SERVICE_AUTHKEY or SECRET_KEY: the default SECRET_KEY is public")
+    return hashlib.sha256(b'render-service:' + str(secret).encode()).digest()
+
+
+def _handle(request):
+    from app.rendering import RENDERERS, compiled_template, template_fingerprint
+    _op, kind, payload, template = request
+    # Registry versions are per web process, so compiled templates are
+    # cached by content here
+    version = template_fingerprint(template) if template is not None else 0
+    return RENDERERS[kind](payload, compiled_template(kind, template, version))
+
+
+class RenderServer:
+    def __init__(self, address, authkey, workers=None, max_requests=0, backlog=None):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.workers = workers or os.cpu_count() or 1
+        self.max_requests = max_requests
+        self.backlog = backlog or self.workers * 16
+        self.listener = None
+        self.processes = []
+        self.running = False
+        self._context = multiprocessing.get_context('fork')
+
+    def start(self):
+        if isinstance(self.address, str):
+            os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # stale socket from a previous run
+            # Owner-only from the moment it is bound, not just after the chmod
+            previous_umask = os.umask(0o177)
+            try:
+                self.listener = Listener(self.address, authkey=self.authkey, backlog=self.backlog)
+            finally:
+                os.umask(previous_umask)
+            os.chmod(self.address, 0o600)
+        else:
+            self.listener = Listener(self.address, authkey=self.authkey, backlog=self.backlog)
+        self.running = True
+        self.processes = [self._spawn() for _ in range(self.workers)]
+        logger.info("Render service listening on %s with %s workers", self.address, self.workers)
+        return self
+
+    def _spawn(self):
+        process = self._context.Process(target=self._worker, name='render-worker', daemon=True)
+        process.start()
+        return process
+
+    def _worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl-C
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        from app.logs import restart_after_fork
+        log_listener = restart_after_fork()
+        served = 0
+        try:
+            while not self.max_requests or served < self.max_requests:
+                try:
+                    conn = self.listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    logger.warning("Rejected render service connection: %s", e)
+                    continue
+                with conn:
+                    try:
+                        request = conn.recv()
+                    except (EOFError, OSError):
+                        continue
+                    try:
+                        response = ('ok', _handle(request))
+                    except Exception as e:
+                        logger.exception("Render failed")
+                        response = ('error', f"{type(e).__name__}: {e}")
+                    try:
+                        conn.send(response)
+                    except OSError:
+                        pass  # the client gave up (timeout) and closed the socket
+                served += 1
+        finally:
+            if log_listener is not None:
+                log_listener.stop()
+
+    def serve_forever(self):
+        def stop(_signum, _frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            while self.running:
+                sentinels = {process.sentinel: process for process in self.processes}
+                for sentinel in wait(list(sentinels), timeout=1):
+                    process = sentinels[sentinel]
+                    process.join()
+                    if process.exitcode:
+                        logger.warning("Render worker %s exited with %s", process.pid, process.exitcode)
+                    if self.running:
+                        self.processes[self.processes.index(process)] = self._spawn()
+                        time.sleep(0.1)  # do not spin if workers die at startup
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join(5)
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+
+class RenderClient:
+    def __init__(self, address, authkey, timeout=30.0, retry_after=10.0):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.down_until = 0.0
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def _connect(self, deadline):
+        family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(max(0.1, deadline - time.monotonic()))
+            sock.connect(self.address)
+            sock.setblocking(True)
+        except OSError:
+            sock.close()
+            raise
+        conn = Connection(sock.detach())
+        # The service speaks first once a worker accepts; waiting here is
+        # queueing for a free worker and counts against the timeout
+        if not conn.poll(max(0.0, deadline - time.monotonic())):
+            conn.close()
+            raise RenderTimeout("No render worker became free in time")
+        # Same handshake as multiprocessing.connection.Client
+        answer_challenge(conn, self.authkey)
+        deliver_challenge(conn, self.authkey)
+        return conn
+
+    def render(self, kind, payload, template=None):
+        """PDF bytes rendered by the service"""
+        deadline = time.monotonic() + self.timeout
+        if template is not None:
+            template = template._replace(data=dict(template.data))  # mappingproxy does not pickle
+        try:
+            conn = self._connect(deadline)
+        except (OSError, AuthenticationError, EOFError) as e:
+            self.down_until = time.monotonic() + self.retry_after
+            raise RenderServiceUnavailable(f"Render service unreachable: {e}")
+        try:
+            conn.send(('render', kind, payload, template))
+            if not conn.poll(max(0.0, deadline - time.monotonic())):
+                raise RenderTimeout(f"Rendering took longer than {self.timeout:g}s")
+            status, result = conn.recv()
+        except (OSError, EOFError) as e:
+            # The worker died mid-render; it is replaced, but do not wait for it
+            raise RenderServiceUnavailable(f"Render service connection lost: {e}")
+        finally:
+            conn.close()
+        if status != 'ok':
+            raise RenderError(result)
+        return result
+
+
+def init_render_service(app):
+    """Use the external render service from this app when RENDER_SERVICE=external"""
+    if app.config.get('RENDER_SERVICE', 'inprocess') != 'external':
+        return None
+    try:
+        authkey = service_authkey(app.config)
+    except RenderServiceConfigError as e:
+        logger.error("Not using the render service, rendering in process: %s", e)
+        return None
+    client = RenderClient(app.config.get('RENDER_SERVICE_ADDRESS'), authkey,
+                          timeout=app.config.get('RENDER_SERVICE_TIMEOUT', 30.0),
+                          retry_after=app.config.get('RENDER_SERVICE_RETRY', 10.0))
+    app.extensions['render_service'] = client
+    return client
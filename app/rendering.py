@@ -0,0 +1,606 @@
+"""
+Template-driven PDF rendering
+
+Each document template's ``template_data`` (colors, style, border, section
+order; see setup_complete.py) is compiled once into a CompiledTemplate:
+ready-made paragraph styles, table styles and the page decoration callback.
+Compiled templates are cached by (kind, template id, registry version), so
+a template edit recompiles on the next render and an unchanged template
+costs a dictionary lookup:
+
+    pdf_bytes = render_document('invoice', payload, template_id)
+
+``template_id=None`` renders with the built-in look. Renderers take plain
+payload dicts (see the render_* functions) and return PDF bytes; they
+never touch the request or the database. Fonts, the base stylesheet and
+decoded images come from app.render_resources; with RENDER_SERVICE=external
+render_document() hands the work to app.render_service.
+"""
+import hashlib
+import json
+import logging
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+from xml.sax.saxutils import escape
+from flask import current_app, has_app_context
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4, LETTER, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import (
+    SimpleDocTemplate, Flowable, Paragraph, Spacer, Table, TableStyle, ListFlowable, ListItem
+)
+from app.invoice_items import items_total
+from app.lru import LRUCache
+from app.render_service import RenderServiceUnavailable
+from app.render_resources import LOGO_MAX_PX, CachedImage, base_stylesheet, document_fonts, image_reader
+
+DOCUMENT_KINDS = ('invoice', 'resume', 'certificate')
+
+# The built-in look; template colors override these
+DEFAULT_PALETTE = {
+    'primary': '#0B5394',
+    'secondary': '#475467',
+    'muted': '#667085',
+    'accent': '#1F2937',
+    'rule': '#D0D5DD',
+    'grid': '#E6EAF2',
+    'stripe': '#F8FAFC',
+    'highlight': '#EEF4FF',
+    'contact': '#555555',
+}
+
+# template_data 'style' -> (regular, bold) font
+STYLE_FONTS = {
+    'professional': ('Times-Roman', 'Times-Bold'),
+    'executive': ('Times-Roman', 'Times-Bold'),
+    'elegant': ('Times-Roman', 'Times-Bold'),
+    'luxury': ('Times-Roman', 'Times-Bold'),
+}
+DEFAULT_FONTS = ('Helvetica', 'Helvetica-Bold')
+
+RESUME_SECTIONS = (('education', 'Education'), ('skills', 'Skills'), ('experience', 'Experience'))
+
+CompiledTemplate = namedtuple('CompiledTemplate', [
+    'kind', 'template_id', 'pagesize', 'margins', 'palette', 'fonts', 'currency',
+    'styles', 'table_styles', 'on_page', 'sections'
+])
+
+logger = logging.getLogger(__name__)
+
+_compiled = LRUCache(max_entries=256)
+
+
+def _color(value, fallback):
+    try:
+        return colors.HexColor(value)
+    except (TypeError, ValueError):
+        return colors.HexColor(fallback)
+
+
+def compile_palette(data):
+    palette = {name: colors.HexColor(value) for name, value in DEFAULT_PALETTE.items()}
+    for name, value in (data.get('colors') or {}).items():
+        if name in palette:
+            palette[name] = _color(value, DEFAULT_PALETTE[name])
+    return palette
+
+
+def _invoice_styles(palette, fonts):
+    base = base_stylesheet()
+    regular, bold = fonts
+    # Amounts use the Unicode font (if one is registered) for the ₹ sign
+    amount_fonts = document_fonts()
+    normal = ParagraphStyle('InvNormal', parent=base['Normal'], fontName=regular)
+    title = ParagraphStyle('InvTitle', parent=base['Title'], fontName=bold)
+    small_muted = ParagraphStyle('SmallMuted', parent=normal, fontSize=9, textColor=palette['muted'])
+    styles = {
+        'normal': normal,
+        'label': ParagraphStyle('Label', parent=normal, textColor=palette['secondary'], fontName=bold),
+        'heading': ParagraphStyle('InvCenter', parent=title, fontSize=32, leading=36, alignment=TA_CENTER),
+        'company': ParagraphStyle('HCenter', parent=title, fontSize=28, leading=32, alignment=TA_CENTER),
+        'meta': ParagraphStyle('DateCenter', parent=small_muted, alignment=TA_CENTER),
+        'bill_bar': ParagraphStyle('BillBar', parent=normal, fontName=bold, textColor=colors.white),
+        'amount': ParagraphStyle('Right', parent=normal, fontName=amount_fonts.regular, alignment=TA_RIGHT),
+        'total_label': ParagraphStyle('TotalLabel', parent=normal, fontName=bold, alignment=TA_RIGHT),
+        'total_amount': ParagraphStyle('TotalRight', parent=normal, fontName=amount_fonts.bold, alignment=TA_RIGHT),
+        'footer': ParagraphStyle('Footer', parent=normal, alignment=TA_CENTER, textColor=palette['secondary']),
+    }
+    table_styles = {
+        'logo': TableStyle([('ALIGN', (0, 0), (-1, -1), 'CENTER')]),
+        'rule': TableStyle([('LINEBELOW', (0, 0), (-1, -1), 1.2, palette['primary'])]),
+        'header': TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]),
+        'bill_bar': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), palette['primary']),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4)
+        ]),
+        'details': TableStyle([
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 0), (-1, -1), 4)
+        ]),
+        'items': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), palette['primary']),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), bold),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('LEFTPADDING', (0, 1), (-1, -1), 10),
+            ('RIGHTPADDING', (0, 1), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 0.25, palette['grid']),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, palette['stripe']])
+        ]),
+        'totals': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), palette['highlight']),
+            ('LINEABOVE', (0, 0), (-1, 0), 0.75, palette['rule']),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.75, palette['rule']),
+            ('TOPPADDING', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 10)
+        ]),
+    }
+    return styles, table_styles
+
+
+def _resume_styles(palette, fonts):
+    base = base_stylesheet()
+    regular, bold = fonts
+    styles = {
+        'name': ParagraphStyle('NameStyle', parent=base['Title'], fontName=bold, fontSize=24, leading=28,
+                               alignment=TA_CENTER, spaceAfter=20),
+        'contact': ParagraphStyle('ContactStyle', parent=base['Normal'], fontName=regular, fontSize=10, leading=12,
+                                  alignment=TA_CENTER, textColor=palette['contact'], spaceAfter=24),
+        'section': ParagraphStyle('SectionHeader', parent=base['Heading2'], fontName=bold, fontSize=14,
+                                  textColor=palette['primary'], spaceBefore=12, spaceAfter=8, alignment=TA_LEFT),
+        'body': ParagraphStyle('BodyText', parent=base['BodyText'], fontName=regular, fontSize=12,
+                               leading=16, spaceAfter=6, alignment=TA_LEFT),
+    }
+    table_styles = {
+        'divider': TableStyle([('LINEABOVE', (0, 0), (-1, -1), 1.2, palette['primary'])]),
+    }
+    return styles, table_styles
+
+
+def _certificate_styles(palette, fonts):
+    base = base_stylesheet()
+    regular, bold = fonts
+    title = ParagraphStyle('CertTitle', parent=base['Title'], fontName=bold, fontSize=32, leading=36,
+                           alignment=TA_CENTER, textColor=palette['primary'], spaceAfter=18)
+    styles = {
+        'title': title,
+        'subtitle': ParagraphStyle('Subtitle', parent=base['Heading2'], fontName=bold, fontSize=14, leading=18,
+                                   alignment=TA_CENTER, textColor=palette['secondary'], spaceAfter=6),
+        'name': ParagraphStyle('Name', parent=base['Title'], fontName=bold, fontSize=28, leading=32,
+                               alignment=TA_CENTER, textColor=palette['accent'], spaceAfter=10),
+        'course': ParagraphStyle('Course', parent=title, fontSize=22, leading=26),
+        'body': ParagraphStyle('Body', parent=base['BodyText'], fontName=regular, fontSize=12, leading=18,
+                               alignment=TA_CENTER, textColor=palette['secondary'], spaceAfter=16),
+    }
+    table_styles = {
+        'signature': TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('LINEABOVE', (0, 0), (-1, 0), 0.8, palette['primary']),
+        ]),
+    }
+    return styles, table_styles
+
+
+def _border_painter(border, palette, pagesize):
+    """The onPage callback drawing a certificate border, built once per template"""
+    width, height = pagesize
+    margin = 28
+    inner = margin + 10
+
+    def simple(canvas, _doc):
+        canvas.saveState()
+        canvas.setLineWidth(5)
+        canvas.setStrokeColor(palette['primary'])
+        canvas.rect(margin, margin, width - 2*margin, height - 2*margin)
+        canvas.setLineWidth(1.2)
+        canvas.setStrokeColor(palette['rule'])
+        canvas.rect(inner, inner, width - 2*inner, height - 2*inner)
+        canvas.restoreState()
+
+    def ornate(canvas, doc):
+        simple(canvas, doc)
+        canvas.saveState()
+        canvas.setFillColor(palette['primary'])
+        size = 14
+        for x in (margin - size / 2, width - margin - size / 2):
+            for y in (margin - size / 2, height - margin - size / 2):
+                canvas.rect(x, y, size, size, stroke=0, fill=1)
+        canvas.restoreState()
+
+    def gold(canvas, doc):
+        simple(canvas, doc)
+        canvas.saveState()
+        canvas.setLineWidth(0.8)
+        canvas.setStrokeColor(palette['primary'])
+        innermost = inner + 6
+        canvas.rect(innermost, innermost, width - 2*innermost, height - 2*innermost)
+        canvas.restoreState()
+
+    return {'ornate': ornate, 'gold': gold}.get(border, simple)
+
+
+def _resume_sections(data):
+    """Sections in template order, limited to the ones the resume form collects"""
+    titles = dict(RESUME_SECTIONS)
+    order = [name for name in (data.get('sections') or ()) if name in titles]
+    order += [name for name, _title in RESUME_SECTIONS if name not in order]
+    return tuple((name, titles[name]) for name in order)
+
+
+def compile_template(kind, data=None, template_id=None):
+    """Compile template_data (a mapping, possibly empty) for one document kind"""
+    if kind not in DOCUMENT_KINDS:
+        raise ValueError(f"Unknown document kind: {kind}")
+    data = data or {}
+    palette = compile_palette(data)
+    fonts = STYLE_FONTS.get(data.get('style'), DEFAULT_FONTS)
+    margins = (72, 72, 72, 72)  # left, right, top, bottom
+    on_page = None
+    sections = ()
+    if kind == 'invoice':
+        pagesize = A4
+        styles, table_styles = _invoice_styles(palette, fonts)
+    elif kind == 'resume':
+        pagesize = LETTER
+        styles, table_styles = _resume_styles(palette, fonts)
+        sections = _resume_sections(data)
+    else:
+        pagesize = landscape(A4)
+        styles, table_styles = _certificate_styles(palette, fonts)
+        on_page = _border_painter(data.get('border'), palette, pagesize)
+    return CompiledTemplate(kind, template_id, pagesize, margins, palette, fonts, document_fonts().currency,
+                            styles, table_styles, on_page, sections)
+
+
+def compiled_template(kind, template=None, version=0):
+    """
+    The cached compiled form of a TemplateInfo (or of the built-in look when
+    ``template`` is None). ``version`` must change whenever the template's
+    data does: the registry version in the web process, template_fingerprint()
+    where templates arrive from several processes (the render service).
+    """
+    key = (kind, template.id, version) if template is not None else (kind, None, 0)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = compile_template(kind, template.data if template is not None else None,
+                                    template.id if template is not None else None)
+        _compiled.set(key, compiled)
+    return compiled
+
+
+def template_fingerprint(template):
+    """A digest of a template's data, for caching compiled templates by content"""
+    data = json.dumps(dict(template.data), sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def lookup_template(kind, template_id):
+    """(TemplateInfo, registry version) for ``template_id``, or (None, 0) for the built-in look"""
+    from app.template_registry import get_template_registry
+    if not template_id:
+        return None, 0
+    registry = get_template_registry()
+    template = registry.get(template_id)
+    if template is None or template.type != kind:
+        raise ValueError("Unknown template")
+    return template, registry.version
+
+
+def resolve_template(kind, template_id):
+    """The active registry template ``template_id`` of this kind, compiled"""
+    return compiled_template(kind, *lookup_template(kind, template_id))
+
+
+def template_choices(group, allow_premium):
+    """Select field choices for a TemplateGroup; premium templates only if allowed"""
+    templates = group.all if allow_premium else group.free
+    return [(0, 'Default')] + [
+        (t.id, f"{t.name} (Premium)" if t.is_premium else t.name) for t in templates
+    ]
+
+
+def _doc(buffer, compiled):
+    left, right, top, bottom = compiled.margins
+    return SimpleDocTemplate(buffer, pagesize=compiled.pagesize,
+                             leftMargin=left, rightMargin=right,
+                             topMargin=top, bottomMargin=bottom)
+
+
+def _text(value):
+    # Paragraph parses its text as markup; user input is plain text
+    return escape(str(value or ''))
+
+
+def format_amount(value, currency='Rs. '):
+    try:
+        return f"{currency}{Decimal(str(value)):,.2f}"
+    except InvalidOperation:
+        return str(value)
+
+
+class LineItemsTable(Flowable):
+    """
+    Invoice line items laid out one page at a time.
+
+    A single ReportLab Table (or LongTable) re-measures every remaining row
+    each time it splits, which is quadratic in the number of rows. This
+    flowable measures each row once and, when the rows do not fit, splits
+    off a plain Table for the rows that do (header repeated on every page,
+    "carried forward" subtotal at the bottom) plus a continuation that
+    starts at the next row with the subtotal "brought forward".
+    """
+
+    HEADER = ['DESCRIPTION', 'AMOUNT (INR)']
+    CELL_PADDING = 20  # LEFTPADDING + RIGHTPADDING of the items table
+
+    def __init__(self, items, col_widths, compiled, start=0, brought_forward=None, _rows=None):
+        super().__init__()
+        self.items = items
+        self.col_widths = col_widths
+        self.compiled = compiled
+        self.start = start
+        self.brought_forward = brought_forward
+        self._rows = _rows if _rows is not None else {}  # row index -> (cells, height), shared
+        self._table = None
+        normal = compiled.styles['normal']
+        self._leading = normal.leading
+        self._header_height = normal.leading + 24
+        self._subtotal_height = normal.leading + 12
+
+    def _row(self, index):
+        row = self._rows.get(index)
+        if row is None:
+            description, amount = self.items[index]
+            style = self.compiled.styles['normal']
+            width = self.col_widths[0] - self.CELL_PADDING
+            if stringWidth(description, style.fontName, style.fontSize) <= width and '\n' not in description:
+                cell, height = description, self._leading  # plain strings are much cheaper to lay out
+            else:
+                cell = Paragraph(_text(description), style)
+                height = cell.wrap(width, 1e6)[1]
+            amount_text = format_amount(amount, self.compiled.currency) if amount is not None else ''
+            row = self._rows[index] = ([cell, amount_text], height + 6)
+        return row
+
+    def _fit(self, available_height):
+        """End index (exclusive) of the rows that fit on this page"""
+        used = self._header_height
+        if self.brought_forward is not None:
+            used += self._subtotal_height
+        end = self.start
+        while end < len(self.items):
+            height = self._row(end)[1]
+            if used + height > available_height:
+                break
+            used += height
+            end += 1
+        if end == len(self.items):
+            return end
+        # Not the last page: leave room for the carried forward row
+        while end > self.start and used + self._subtotal_height > available_height:
+            end -= 1
+            used -= self._row(end)[1]
+        return end
+
+    def _subtotal(self, end):
+        total = self.brought_forward or Decimal('0')
+        for description, amount in self.items[self.start:end]:
+            if amount is not None:
+                total += amount
+        return total
+
+    def _page_table(self, end, carried_forward=None):
+        styles = self.compiled.styles
+        rows = [self.HEADER]
+        normal = styles['normal']
+        commands = [
+            # Plain-string descriptions are measured with the normal style, so draw them with it
+            ('FONTNAME', (0, 1), (0, -1), normal.fontName),
+            ('FONTSIZE', (0, 1), (0, -1), normal.fontSize),
+            ('LEADING', (0, 1), (0, -1), normal.leading),
+            ('FONTNAME', (1, 1), (1, -1), styles['amount'].fontName),
+            ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+        ]
+        subtotal_rows = []
+        if self.brought_forward is not None:
+            subtotal_rows.append(len(rows))
+            rows.append(['Brought forward', format_amount(self.brought_forward, self.compiled.currency)])
+        rows.extend(self._row(index)[0] for index in range(self.start, end))
+        if carried_forward is not None:
+            subtotal_rows.append(len(rows))
+            rows.append(['Subtotal carried forward', format_amount(carried_forward, self.compiled.currency)])
+        for row in subtotal_rows:
+            commands += [
+                ('BACKGROUND', (0, row), (-1, row), self.compiled.palette['highlight']),
+                ('FONTNAME', (0, row), (0, row), self.compiled.fonts[1]),
+                ('FONTNAME', (1, row), (1, row), styles['total_amount'].fontName),
+                ('ALIGN', (0, row), (0, row), 'RIGHT'),
+                ('TOPPADDING', (0, row), (-1, row), 6),
+                ('BOTTOMPADDING', (0, row), (-1, row), 6),
+            ]
+        style = TableStyle(commands, parent=self.compiled.table_styles['items'])
+        return Table(rows, colWidths=self.col_widths, style=style)
+
+    def wrap(self, available_width, available_height):
+        if self._fit(available_height) < len(self.items):
+            # Too long for this frame; the frame will split it
+            self._table = None
+            return self.col_widths[0] + self.col_widths[1], available_height + 1
+        self._table = self._page_table(len(self.items))
+        return self._table.wrap(available_width, available_height)
+
+    def split(self, available_width, available_height):
+        end = self._fit(available_height)
+        if end >= len(self.items):
+            table = self._page_table(end)
+            if table.wrap(available_width, available_height)[1] <= available_height:
+                return [table]
+            end -= 1
+        while end > self.start:
+            carried = self._subtotal(end)
+            table = self._page_table(end, carried)
+            if table.wrap(available_width, available_height)[1] <= available_height:
+                return [table, LineItemsTable(self.items, self.col_widths, self.compiled,
+                                              end, carried, self._rows)]
+            end -= 1  # the estimate was a little optimistic
+        return []
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+
+def render_invoice(payload, compiled):
+    """
+    payload: company, client, gst, items (LineItems), total (optional,
+    defaults to the sum of the items), invoice_no, date, logo_path (optional)
+    """
+    buffer = BytesIO()
+    doc = _doc(buffer, compiled)
+    styles, table_styles = compiled.styles, compiled.table_styles
+    content_width = doc.width
+    flowables = []
+
+    # Centered header: logo, INVOICE, company, date and number
+    header_flow = []
+    logo = image_reader(payload['logo_path'], LOGO_MAX_PX) if payload.get('logo_path') else None
+    if logo is not None:
+        img = CachedImage(logo, 1.2*inch, 1.2*inch)
+        header_flow.append(Table([[img]], colWidths=[content_width], style=table_styles['logo']))
+        header_flow.append(Spacer(1, 6))
+    header_flow.append(Paragraph('INVOICE', styles['heading']))
+    header_flow.append(Table([[""]], colWidths=[content_width], style=table_styles['rule']))
+    header_flow.append(Spacer(1, 6))
+    header_flow.append(Paragraph(_text(payload['company']), styles['company']))
+    header_flow.append(Paragraph(_text(payload['date']), styles['meta']))
+    header_flow.append(Paragraph(f"Invoice #: {_text(payload['invoice_no'])}", styles['meta']))
+    header_flow.append(Spacer(1, 6))
+    flowables.append(Table([[header_flow]], colWidths=[content_width], style=table_styles['header']))
+    flowables.append(Spacer(1, 26))
+
+    # BILL TO heading bar and the bill-to block under it
+    flowables.append(Table([[Paragraph('BILL TO', styles['bill_bar'])]], colWidths=[content_width*0.48],
+                           hAlign='LEFT', style=table_styles['bill_bar']))
+    details_rows = [
+        [Paragraph('Company:', styles['label']), Paragraph(_text(payload['company']), styles['normal'])],
+        [Paragraph('GST Number:', styles['label']), Paragraph(_text(payload['gst']), styles['normal'])],
+        [Paragraph('Bill To:', styles['label']), Paragraph(_text(payload['client']), styles['normal'])],
+    ]
+    flowables.append(Table(details_rows, colWidths=[content_width * 0.18, content_width * 0.30],
+                           hAlign='LEFT', style=table_styles['details']))
+    flowables.append(Spacer(1, 24))
+
+    items = payload.get('items') or ()
+    items_left = content_width * 0.70
+    items_right = content_width - items_left
+    flowables.append(LineItemsTable(items, [items_left, items_right], compiled))
+
+    # Totals row aligned with items table columns
+    flowables.append(Spacer(1, 12))
+    total_value = payload.get('total') or items_total(items)
+    flowables.append(Table([
+        [Paragraph('TOTAL', styles['total_label']),
+         Paragraph(_text(format_amount(total_value, compiled.currency)), styles['total_amount'])]
+    ], colWidths=[items_left, items_right], style=table_styles['totals']))
+
+    flowables.append(Spacer(1, 18))
+    flowables.append(Paragraph("Thank you for your business", styles['footer']))
+
+    doc.build(flowables)
+    return buffer.getvalue()
+
+
+def render_resume(payload, compiled):
+    """payload: name, email, phone, education, skills, experience"""
+    buffer = BytesIO()
+    doc = _doc(buffer, compiled)
+    styles = compiled.styles
+    flowables = [Paragraph(_text(payload['name']), styles['name'])]
+
+    contact_info = _text(payload['email'])
+    if payload.get('phone'):
+        contact_info += f" | {_text(payload['phone'])}"
+    flowables.append(Paragraph(contact_info, styles['contact']))
+
+    # Divider
+    flowables.append(Table([['']], colWidths=[6*inch], style=compiled.table_styles['divider'],
+                           spaceBefore=0, spaceAfter=12))
+
+    for field, title in compiled.sections:
+        flowables.append(Paragraph(title, styles['section']))
+        lines = [line.strip() for line in (payload.get(field) or '').split('\n') if line.strip()]
+        if not lines:
+            flowables.append(Paragraph("N/A", styles['body']))
+            continue
+        bullet_items = [ListItem(Paragraph(_text(line), styles['body'])) for line in lines]
+        flowables.append(ListFlowable(bullet_items, bulletType='bullet', start='circle'))
+
+    doc.build(flowables)
+    return buffer.getvalue()
+
+
+def render_certificate(payload, compiled):
+    """
+    payload: recipient_name, course_title, issuer, date_issued,
+    signature_name, signature_title
+    """
+    buffer = BytesIO()
+    doc = _doc(buffer, compiled)
+    styles = compiled.styles
+    flowables = [
+        Paragraph('Certificate of Completion', styles['title']),
+        Paragraph('This is to certify that', styles['subtitle']),
+        Paragraph(_text(payload['recipient_name']), styles['name']),
+        Paragraph('has successfully completed', styles['subtitle']),
+        Paragraph(_text(payload['course_title']), styles['course']),
+        Spacer(1, 12),
+        Paragraph(f"Issued by {_text(payload['issuer'])} on {_text(payload['date_issued'])}", styles['body']),
+    ]
+
+    # Signature section
+    sig_name = (payload.get('signature_name') or '').strip()
+    sig_title = (payload.get('signature_title') or '').strip()
+    if sig_name:
+        flowables.append(Spacer(1, 24))
+        flowables.append(Table(
+            [[Paragraph(_text(sig_name), styles['body'])], [Paragraph(_text(sig_title), styles['body'])]],
+            colWidths=[4*inch], style=compiled.table_styles['signature']
+        ))
+
+    if compiled.on_page:
+        doc.build(flowables, onFirstPage=compiled.on_page, onLaterPages=compiled.on_page)
+    else:
+        doc.build(flowables)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'invoice': render_invoice,
+    'resume': render_resume,
+    'certificate': render_certificate,
+}
+
+
+def render_document(kind, payload, template_id=None):
+    """
+    Render a document with a registry template (or the built-in look) to
+    PDF bytes, in the render service when one is configured
+    """
+    template, version = lookup_template(kind, template_id)
+    service = current_app.extensions.get('render_service') if has_app_context() else None
+    if service is not None and service.available():
+        try:
+            return service.render(kind, payload, template)
+        except RenderServiceUnavailable as e:
+            logger.warning("%s; rendering in process", e)
+    return RENDERERS[kind](payload, compiled_template(kind, template, version))
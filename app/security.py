@@ -1,35 +1,34 @@
 """
 Security utilities including rate limiting, CSRF protection, and error handling
 """
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, has_request_context, has_app_context, current_app
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from functools import wraps
 import logging
-from datetime import datetime
+from app.security_events import init_security_events, record_security_event
+from app.bruteforce import init_bruteforce
+from app import ratelimit_storage  # noqa: F401, registers the sqlite:// and resp:// limiter storages
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
-
+# Handlers are set up by app.logs.init_logging (queued, JSON lines)
 logger = logging.getLogger(__name__)
 
 def init_security(app):
     """Initialize security features"""
-    # Rate limiting
+    # Rate limiting, counters shared by all workers (RATELIMIT_STORAGE_URI)
     limiter = Limiter(
         key_func=get_remote_address,
         default_limits=["200 per day", "50 per hour"]
     )
     limiter.init_app(app)
     
+    # Security event store
+    init_security_events(app)
+    
+    # Brute-force login detection
+    init_bruteforce(app)
+    
     # Configure specific rate limits - apply after blueprints are registered
     # These will be applied when the app is fully initialized
     
@@ -37,34 +36,37 @@ def init_security(app):
 
 def apply_rate_limits(app, limiter):
     """Apply rate limits to view functions after blueprints are registered"""
+    endpoint_limits = {
+        'auth.login': "10 per minute",
+        'auth.register': "5 per minute",
+    }
     try:
-        # Apply rate limits to specific endpoints
-        if 'auth.login' in app.view_functions:
-            limiter.limit("10 per minute")(app.view_functions['auth.login'])
-        if 'auth.register' in app.view_functions:
-            limiter.limit("5 per minute")(app.view_functions['auth.register'])
-        if 'main.invoice' in app.view_functions:
-            limiter.limit("20 per minute")(app.view_functions['main.invoice'])
-        if 'main.resume_builder' in app.view_functions:
-            limiter.limit("20 per minute")(app.view_functions['main.resume_builder'])
-        if 'main.certificate_generator' in app.view_functions:
-            limiter.limit("20 per minute")(app.view_functions['main.certificate_generator'])
-        if 'main.qrcode_generator' in app.view_functions:
-            limiter.limit("30 per minute")(app.view_functions['main.qrcode_generator'])
+        # Apply rate limits to specific endpoints. The limit is checked by the
+        # wrapper limiter.limit() returns, so it has to replace the view.
+        for endpoint, limit in endpoint_limits.items():
+            if endpoint in app.view_functions:
+                app.view_functions[endpoint] = limiter.limit(limit)(app.view_functions[endpoint])
+
+        # Document endpoints: per-user token buckets sized by the plan
+        from app.user_ratelimit import init_user_rate_limits
+        init_user_rate_limits(app, limiter)
     except Exception as e:
         logger.error(f"Error applying rate limits: {e}")
 
 def log_security_event(event_type, user_id=None, ip_address=None, details=None):
-    """Log security events"""
+    """Log security events (sampled per event type, see LOG_SAMPLE_RATES)"""
     log_data = {
-        'timestamp': datetime.utcnow().isoformat(),
-        'event_type': event_type,
         'user_id': user_id,
-        'ip_address': ip_address or get_remote_address(),
+        'ip_address': ip_address or (get_remote_address() if has_request_context() else None),
+        'path': request.path if has_request_context() else None,
         'details': details or {}
     }
     
-    logger.warning(f"Security Event: {log_data}")
+    logger.warning("Security Event: %s", event_type, extra={'event_type': event_type, 'event': log_data})
+    
+    # Keep a queryable copy for the admin security page (buffered, batched writes)
+    if has_app_context():
+        record_security_event(event_type, user_id, log_data['ip_address'], log_data['path'], details)
 
 def validate_file_upload(file, allowed_extensions=None, max_size_mb=10):
     """Validate file uploads for security"""
@@ -99,17 +101,33 @@ def sanitize_input(text):
     
     return text.strip()
 
-def check_suspicious_activity(user_id, ip_address):
-    """Check for suspicious activity patterns"""
-    # This is a simplified version - in production, you'd use a proper security service
-    
-    # Check for rapid successive requests
-    # Check for unusual IP patterns
-    # Check for failed login attempts
-    
-    # For now, just log the activity
-    log_security_event('activity_check', user_id, ip_address)
-    return False
+def check_suspicious_activity(user_id, ip_address, email=None):
+    """
+    Check for brute-force patterns before a login attempt.
+    Returns the number of seconds the caller is locked out for (0 if the
+    attempt may proceed), so it can be used as a boolean.
+    """
+    detector = current_app.extensions.get('bruteforce')
+    if detector is None:
+        return 0
+    return detector.retry_after(ip_address, email)
+
+def record_failed_login(ip_address, email, user_id=None, event_type='login_failed'):
+    """Count a failed login and log when it trips a brute-force threshold"""
+    record_security_event(event_type, user_id, ip_address,
+                          request.path if has_request_context() else None, {'email': email})
+    detector = current_app.extensions.get('bruteforce')
+    if detector is None:
+        return
+    tripped = detector.record_failure(ip_address, email)
+    if tripped:
+        log_security_event('brute_force_suspected', user_id, ip_address,
+                           details={'email': email, 'keys': tripped})
+
+def record_successful_login(ip_address, email):
+    detector = current_app.extensions.get('bruteforce')
+    if detector is not None:
+        detector.record_success(ip_address, email)
 
 def require_verification(f):
     """Decorator to require email verification"""
@@ -188,6 +206,11 @@ def create_error_templates():
             'title': 'Internal Server Error',
             'message': 'Something went wrong on our end. Please try again later.',
             'icon': 'fas fa-exclamation-circle'
+        },
+        '503.html': {
+            'title': 'Busy Right Now',
+            'message': 'We are generating a lot of documents at the moment. Please try again in a few seconds.',
+            'icon': 'fas fa-hourglass-half'
         }
     }
     
@@ -0,0 +1,168 @@
+"""
+Security event store
+
+log_security_event() appends events to an in-memory buffer; a background
+thread writes the buffer to the security_event table with one executemany
+INSERT every SECURITY_EVENT_FLUSH_INTERVAL seconds, or sooner once
+SECURITY_EVENT_BATCH_SIZE events are waiting. Requests never wait on the
+database for an event.
+
+Retention is by day: once an hour the flusher deletes whole days older
+than SECURITY_EVENT_RETENTION_DAYS, a bounded range delete on the
+created_at index per day, so pruning never scans the table.
+
+query_events() backs the admin security page; its filters all map onto one
+of the (event_type|ip_address|user_id, created_at) indexes.
+"""
+import atexit
+import json
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, func
+from app import db
+from app.models import SecurityEvent
+
+logger = logging.getLogger(__name__)
+
+EventSummary = namedtuple('EventSummary', ['event_type', 'count'])
+
+
+class SecurityEventBuffer:
+    """Thread-safe in-memory buffer flushed to the database in batches"""
+
+    def __init__(self, app, batch_size=500, flush_interval=2.0, max_buffer=50000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_prune = None
+        self._thread = None
+
+    def add(self, event_type, user_id=None, ip_address=None, path=None, details=None):
+        row = {
+            'created_at': datetime.utcnow(),
+            'event_type': event_type[:40],
+            'user_id': user_id,
+            'ip_address': ip_address,
+            'path': (path or '')[:200] or None,
+            'details': json.dumps(details, default=str) if details else None,
+        }
+        with self._lock:
+            if len(self._events) >= self.max_buffer:
+                # The database is not keeping up; shed load instead of memory
+                self.dropped += 1
+                return
+            self._events.append(row)
+            full = len(self._events) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._events = self._events, []
+            if not rows:
+                return 0
+            with self.app.app_context():
+                try:
+                    db.session.execute(insert(SecurityEvent), rows)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Could not store %s security events", len(rows))
+                    return 0
+                finally:
+                    db.session.remove()
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if self._last_prune is None or datetime.utcnow() - self._last_prune > timedelta(hours=1):
+                self._last_prune = datetime.utcnow()
+                with self.app.app_context():
+                    try:
+                        prune_events(self.app.config.get('SECURITY_EVENT_RETENTION_DAYS', 30))
+                    except Exception:
+                        db.session.rollback()
+                        logger.exception("Could not prune security events")
+                    finally:
+                        db.session.remove()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='security-events', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+        return self
+
+
+def init_security_events(app):
+    buffer = SecurityEventBuffer(
+        app,
+        batch_size=app.config.get('SECURITY_EVENT_BATCH_SIZE', 500),
+        flush_interval=app.config.get('SECURITY_EVENT_FLUSH_INTERVAL', 2.0)
+    )
+    app.extensions['security_events'] = buffer
+    return buffer.start()
+
+
+def record_security_event(event_type, user_id=None, ip_address=None, path=None, details=None):
+    """Buffer an event for the store (no-op outside an app with the store set up)"""
+    buffer = current_app.extensions.get('security_events')
+    if buffer is not None:
+        buffer.add(event_type, user_id, ip_address, path, details)
+
+
+def flush_security_events():
+    buffer = current_app.extensions.get('security_events')
+    return buffer.flush() if buffer is not None else 0
+
+
+def prune_events(retention_days):
+    """Delete whole days of events older than the retention period, oldest first"""
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    oldest = db.session.query(func.min(SecurityEvent.created_at)).scalar()
+    deleted = 0
+    while oldest is not None and oldest < cutoff:
+        day_end = min(oldest.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1), cutoff)
+        deleted += SecurityEvent.query.filter(SecurityEvent.created_at < day_end)\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        oldest = db.session.query(func.min(SecurityEvent.created_at)).scalar()
+    return deleted
+
+
+def query_events(event_type=None, ip_address=None, user_id=None, since=None, before_id=None, limit=100):
+    """Newest events first, optionally filtered; ``before_id`` pages further back"""
+    query = SecurityEvent.query
+    if event_type:
+        query = query.filter(SecurityEvent.event_type == event_type)
+    if ip_address:
+        query = query.filter(SecurityEvent.ip_address == ip_address)
+    if user_id is not None:
+        query = query.filter(SecurityEvent.user_id == user_id)
+    if since:
+        query = query.filter(SecurityEvent.created_at >= since)
+    if before_id:
+        query = query.filter(SecurityEvent.id < before_id)
+    return query.order_by(SecurityEvent.created_at.desc(), SecurityEvent.id.desc()).limit(limit).all()
+
+
+def summarize_events(since):
+    """Event counts per type since a point in time (range scan on created_at)"""
+    rows = db.session.query(SecurityEvent.event_type, func.count(SecurityEvent.id))\
+        .filter(SecurityEvent.created_at >= since)\
+        .group_by(SecurityEvent.event_type)\
+        .order_by(func.count(SecurityEvent.id).desc()).all()
+    return [EventSummary(event_type, count) for event_type, count in rows]
@@ -0,0 +1,261 @@
+"""
+Content-addressed storage for generated files (PDFs, QR code images)
+
+Files are stored under a key derived from the SHA-256 of their content:
+
+    <kind>/<aa>/<bb>/<sha256>.<ext>
+
+The two shard levels keep any single directory small, identical outputs
+share one file, and only the relative key is stored in the database.
+
+Two backends are available, selected with STORAGE_BACKEND:
+
+    local  files under STORAGE_ROOT (default instance/files)
+    s3     an S3-compatible bucket (AWS, MinIO, ...), so app nodes keep
+           no state on local disk
+
+Local files are only served through signed /files/<token> URLs (see
+app/downloads.py), so the root must not be under static/. Installs that
+used the old default, app/static/files, move the directory over; keys are
+relative to the root, so nothing in the database changes:
+
+    mkdir -p instance && mv app/static/files instance/files
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+from collections import namedtuple
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+StoredFile = namedtuple('StoredFile', ['key', 'size', 'digest'])
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_key(kind, digest, ext):
+    return f"{kind}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def _copy_hashing(source, target):
+    """Copy a stream in chunks, returning (sha256 hexdigest, size)"""
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        sha.update(chunk)
+        target.write(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+class LocalStorage:
+    """Hash-sharded storage on the local filesystem"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        """Absolute path for a key. Legacy absolute paths are returned unchanged."""
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def save(self, data, kind, ext):
+        """
+        Store bytes and return a StoredFile. Writing is atomic (temp file in
+        the target directory, then rename) and identical content is only
+        written once.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        key = make_key(kind, digest, ext)
+        target = self.path(key)
+        if not os.path.exists(target):
+            directory = os.path.dirname(target)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return StoredFile(key, len(data), digest)
+
+    def save_stream(self, stream, kind, ext):
+        """Store a file-like object without holding it in memory"""
+        staging = os.path.join(self.root, '.staging')
+        os.makedirs(staging, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=staging, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                digest, size = _copy_hashing(stream, f)
+                f.flush()
+                os.fsync(f.fileno())
+            key = make_key(kind, digest, ext)
+            target = self.path(key)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredFile(key, size, digest)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+class S3Storage:
+    """
+    Hash-sharded storage in an S3-compatible bucket.
+
+    Works against AWS S3 or any S3 API (MinIO, localstack) by setting
+    S3_ENDPOINT_URL. Requires boto3.
+    """
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, url_expires=3600):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.url_expires = url_expires
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            # Path-style addressing keeps MinIO-style endpoints working
+            config=BotoConfig(s3={'addressing_style': 'path'})
+        )
+
+    def _object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def path(self, key):
+        # Objects have no local path; legacy absolute paths still do
+        return key if os.path.isabs(key) else None
+
+    def exists(self, key):
+        if os.path.isabs(key):
+            return os.path.exists(key)
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except ClientError:
+            return False
+
+    def _upload(self, fileobj, key, ext):
+        content_type = mimetypes.guess_type(f"file.{ext}")[0] or 'application/octet-stream'
+        self.client.upload_fileobj(
+            fileobj, self.bucket, self._object_key(key),
+            ExtraArgs={'ContentType': content_type}
+        )
+
+    def save(self, data, kind, ext):
+        digest = hashlib.sha256(data).hexdigest()
+        key = make_key(kind, digest, ext)
+        if not self.exists(key):
+            from io import BytesIO
+            self._upload(BytesIO(data), key, ext)
+        return StoredFile(key, len(data), digest)
+
+    def save_stream(self, stream, kind, ext):
+        """
+        Spool the stream to a temporary file while hashing it (the key
+        depends on the content), then upload with multipart transfers.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            digest, size = _copy_hashing(stream, spool)
+            key = make_key(kind, digest, ext)
+            if not self.exists(key):
+                spool.seek(0)
+                self._upload(spool, key, ext)
+        return StoredFile(key, size, digest)
+
+    def open(self, key):
+        """Streaming body for the object (read in chunks, never buffered whole)"""
+        if os.path.isabs(key):
+            return open(key, 'rb')
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response['Body']
+
+    def delete(self, key):
+        if os.path.isabs(key):
+            try:
+                os.remove(key)
+                return True
+            except FileNotFoundError:
+                return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def url(self, key, download_name=None, as_attachment=False):
+        """Short-lived presigned GET URL"""
+        if os.path.isabs(key):
+            return None
+        params = {'Bucket': self.bucket, 'Key': self._object_key(key)}
+        if download_name:
+            kind = 'attachment' if as_attachment else 'inline'
+            params['ResponseContentDisposition'] = f'{kind}; filename="{download_name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expires)
+
+
+def create_storage(config, instance_path):
+    """Build the storage backend described by the app config"""
+    backend = (config.get('STORAGE_BACKEND') or 'local').lower()
+    if backend == 's3':
+        return S3Storage(
+            bucket=config.get('S3_BUCKET'),
+            prefix=config.get('S3_PREFIX', ''),
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY_ID'),
+            secret_key=config.get('S3_SECRET_ACCESS_KEY')
+        )
+    if backend != 'local':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return LocalStorage(config.get('STORAGE_ROOT') or os.path.join(instance_path, 'files'))
+
+
+def init_storage(app):
+    """Attach the storage backend to the app"""
+    app.extensions['storage'] = create_storage(app.config, app.instance_path)
+    legacy_root = os.path.join(app.root_path, 'static', 'files')
+    if os.path.isdir(legacy_root) and isinstance(app.extensions['storage'], LocalStorage) \
+            and app.extensions['storage'].root != os.path.abspath(legacy_root):
+        logger.warning("%s is publicly served and no longer used; move it to %s",
+                       legacy_root, app.extensions['storage'].root)
+    return app.extensions['storage']
+
+
+def get_storage():
+    return current_app.extensions['storage']
@@ -0,0 +1,151 @@
+"""
+In-process registry of document templates
+
+Templates almost never change, so instead of querying the template table
+on every request the registry loads all active templates once, indexed by
+type and premium flag, and views read them from dictionaries:
+
+    registry = get_template_registry()
+    group = registry.templates('invoice')   # group.free, group.premium, group.all
+    template = registry.get(template_id)
+
+Entries are immutable TemplateInfo tuples with ``template_data`` already
+parsed. ``registry.version`` goes up on every reload, so caches built from
+templates (compiled styles, for example) can key on it.
+
+Reloads happen when:
+    - a Template row is inserted, updated or deleted in this process
+      (mapper events, applied when the transaction commits)
+    - another process changed the table: the (row count, latest updated_at)
+      stamp is polled at most every TEMPLATE_REGISTRY_REFRESH_INTERVAL
+      seconds
+"""
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models import Template
+
+logger = logging.getLogger(__name__)
+
+TemplateInfo = namedtuple('TemplateInfo', ['id', 'name', 'type', 'is_premium', 'data', 'preview_image'])
+TemplateGroup = namedtuple('TemplateGroup', ['free', 'premium', 'all'])
+
+EMPTY_GROUP = TemplateGroup((), (), ())
+
+
+def _template_info(row):
+    try:
+        data = json.loads(row.template_data) if row.template_data else {}
+    except ValueError:
+        logger.warning("Template %s has invalid template_data", row.id)
+        data = {}
+    return TemplateInfo(row.id, row.name, row.type, bool(row.is_premium),
+                        MappingProxyType(data), row.preview_image)
+
+
+class TemplateRegistry:
+    def __init__(self, refresh_interval=30.0):
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self.stamp = None
+        self._by_type = {}
+        self._by_id = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        if time.monotonic() - self._checked_at >= self.refresh_interval:
+            self._refresh()
+
+    def templates(self, template_type):
+        """Active templates of one type, split by premium flag"""
+        self._current()
+        return self._by_type.get(template_type, EMPTY_GROUP)
+
+    def get(self, template_id):
+        """An active template by id, or None"""
+        self._current()
+        return self._by_id.get(template_id)
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        self.stamp = None
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.refresh_interval:
+                return  # another thread just did it
+            self._checked_at = now
+            try:
+                stamp = tuple(db.session.query(func.count(Template.id), func.max(Template.updated_at)).one())
+                if stamp != self.stamp:
+                    self._load(stamp)
+            except SQLAlchemyError:
+                # template table not created yet; serve what we have
+                db.session.rollback()
+
+    def _load(self, stamp):
+        rows = Template.query.filter_by(is_active=True).order_by(Template.id).all()
+        groups = {}
+        for row in rows:
+            groups.setdefault(row.type, []).append(_template_info(row))
+        # Build the new index completely, then swap it in with plain assignments
+        self._by_type = {
+            template_type: TemplateGroup(
+                free=tuple(t for t in infos if not t.is_premium),
+                premium=tuple(t for t in infos if t.is_premium),
+                all=tuple(infos)
+            )
+            for template_type, infos in groups.items()
+        }
+        self._by_id = {t.id: t for infos in groups.values() for t in infos}
+        self.stamp = stamp
+        self.version += 1
+
+
+def _template_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['templates_changed'] = True
+
+
+def _after_commit(session):
+    # Reload only once the change is visible to other sessions
+    if session.info.pop('templates_changed', False) and has_app_context():
+        registry = current_app.extensions.get('template_registry')
+        if registry is not None:
+            registry.invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop('templates_changed', None)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Template, _event_name, _template_changed)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_rollback', _after_rollback)
+
+
+def init_template_registry(app):
+    registry = TemplateRegistry(app.config.get('TEMPLATE_REGISTRY_REFRESH_INTERVAL', 30.0))
+    app.extensions['template_registry'] = registry
+    with app.app_context():
+        # Warm it at startup so the first request does not pay for the load
+        registry._refresh()
+        db.session.remove()
+    return registry
+
+
+def get_template_registry():
+    return current_app.extensions['template_registry']
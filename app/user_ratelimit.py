@@ -0,0 +1,114 @@
+"""
+Per-user, plan-aware rate limits
+
+The document endpoints share one token bucket per user instead of fixed
+per-IP limits. The capacity ('burst') and refill rate
+('requests_per_minute') come from the user's plan in get_user_limits(), so
+a premium account behind a shared NAT keeps its own budget and a free
+account cannot multiply its budget by switching IPs. Requests that are not
+logged in are keyed by IP with the free plan.
+
+Each endpoint has a cost in tokens; only requests that generate something
+(POST) are charged, form pages just report the current state. Responses
+carry the bucket state so clients can pace themselves:
+
+    X-RateLimit-Limit      bucket capacity
+    X-RateLimit-Remaining  tokens left
+    X-RateLimit-Reset      seconds until the bucket is full again
+    Retry-After            on 429, seconds until the request would fit
+
+Buckets live in the shared limiter storage (RATELIMIT_STORAGE_URI), so all
+workers draw from the same budget; with memory:// or while the storage is
+down they fall back to per-process buckets. These endpoints are exempt
+from the IP based default limits.
+"""
+import logging
+import math
+from flask import current_app, g, request, render_template, make_response
+from flask_login import current_user
+from flask_limiter.util import get_remote_address
+from app.ratelimit_storage import MemoryTokenBuckets
+from app.subscription_utils import get_user_limits
+
+logger = logging.getLogger(__name__)
+
+# Endpoint -> tokens per request
+USER_RATE_LIMITED_ENDPOINTS = {
+    'main.invoice': 1,
+    'main.resume_builder': 1,
+    'main.certificate_generator': 1,
+    'main.qrcode_generator': 1,
+    'bulk.bulk_certificates': 10,
+    'bulk.bulk_qrcodes': 10,
+}
+
+FREE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class UserRateLimiter:
+    def __init__(self, limiter, endpoints):
+        self.limiter = limiter
+        self.endpoints = endpoints
+        self.fallback = MemoryTokenBuckets()
+
+    def bucket_key(self):
+        if current_user.is_authenticated:
+            return f'user:{current_user.id}'
+        return f'ip:{get_remote_address()}'
+
+    def acquire(self, key, rate, capacity, cost):
+        storage = self.limiter.storage
+        if hasattr(storage, 'acquire_token'):
+            try:
+                return storage.acquire_token(key, rate, capacity, cost)
+            except storage.base_exceptions:
+                logger.warning("Rate limit storage unreachable, using per-process token buckets")
+        return self.fallback.acquire_token(key, rate, capacity, cost)
+
+    def check_request(self):
+        cost = self.endpoints.get(request.endpoint)
+        if cost is None or not current_app.config.get('RATELIMIT_ENABLED', True):
+            return None
+        limits = get_user_limits()
+        capacity = limits['burst']
+        rate = limits['requests_per_minute'] / 60.0
+        if request.method in FREE_METHODS:
+            cost = 0
+        result = self.acquire(self.bucket_key(), rate, capacity, cost)
+        g.rate_limit = (capacity, result)
+        if result.allowed:
+            return None
+
+        from app.security import log_security_event
+        log_security_event('rate_limit_exceeded', getattr(current_user, 'id', None),
+                           details={'endpoint': request.endpoint, 'plan_burst': capacity})
+        return make_response(render_template('errors/429.html'), 429)
+
+    def add_headers(self, response):
+        state = g.get('rate_limit')
+        if state is None:
+            return response
+        capacity, result = state
+        response.headers['X-RateLimit-Limit'] = str(capacity)
+        response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+        response.headers['X-RateLimit-Reset'] = str(math.ceil(result.reset_after))
+        if not result.allowed:
+            response.headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+        return response
+
+
+def init_user_rate_limits(app, limiter, endpoints=None):
+    """Put the plan-aware buckets in front of the document endpoints"""
+    endpoints = {
+        endpoint: cost
+        for endpoint, cost in (endpoints or USER_RATE_LIMITED_ENDPOINTS).items()
+        if endpoint in app.view_functions
+    }
+    user_limiter = UserRateLimiter(limiter, endpoints)
+    for endpoint in endpoints:
+        # The per-user bucket replaces the per-IP defaults here
+        limiter.exempt(app.view_functions[endpoint])
+    app.before_request(user_limiter.check_request)
+    app.after_request(user_limiter.add_headers)
+    app.extensions['user_rate_limiter'] = user_limiter
+    return user_limiter
@@ -22,11 +22,106 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@microsaas.com')
+    EMAIL_VERIFICATION_MAX_AGE = int(os.getenv('EMAIL_VERIFICATION_MAX_AGE', 24 * 3600))  # seconds a verification link stays valid
+
+    # Email Outbox (background sending)
+    EMAIL_WORKER = os.getenv('EMAIL_WORKER', 'thread')  # 'thread' (in the web process) or 'external'
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 2))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    EMAIL_OUTBOX_BACKOFF = int(os.getenv('EMAIL_OUTBOX_BACKOFF', 30))  # seconds, doubled per attempt
+    EMAIL_OUTBOX_MAX_BACKOFF = int(os.getenv('EMAIL_OUTBOX_MAX_BACKOFF', 3600))
+    EMAIL_OUTBOX_LOCK_TIMEOUT = int(os.getenv('EMAIL_OUTBOX_LOCK_TIMEOUT', 300))
+    EMAIL_SMTP_IDLE_TIMEOUT = int(os.getenv('EMAIL_SMTP_IDLE_TIMEOUT', 60))
+    EMAIL_SMTP_CONNECTIONS = int(os.getenv('EMAIL_SMTP_CONNECTIONS', 2))
+    EMAIL_RATE_LIMIT = float(os.getenv('EMAIL_RATE_LIMIT', 10))  # messages/second across all connections, 0 = unlimited
+    MAIL_MAX_EMAILS = int(os.getenv('MAIL_MAX_EMAILS', 100)) or None  # messages per SMTP connection before reconnecting
     
     # Security Configuration
-    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+    # Rate limit counters shared by all workers (see app/ratelimit_storage.py):
+    # sqlite:///path for one machine, resp://host:port/db for a Redis protocol server
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', os.getenv(
+        'RATELIMIT_STORAGE_URL',
+        'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ratelimit.db')
+    ))
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter')
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True  # per-process limits while the shared storage is down
+    
+    # Plan entitlements: seconds between checks for plan edits made in the admin panel
+    ENTITLEMENTS_REFRESH_INTERVAL = float(os.getenv('ENTITLEMENTS_REFRESH_INTERVAL', 5))
+    # Document templates: seconds between checks for changes made by other processes
+    TEMPLATE_REGISTRY_REFRESH_INTERVAL = float(os.getenv('TEMPLATE_REGISTRY_REFRESH_INTERVAL', 30))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Logging Configuration (JSON lines written by a background thread)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOGIN_LOG_FILE = os.getenv('LOGIN_LOG_FILE', 'login_activity.log')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_CONSOLE = os.getenv('LOG_CONSOLE', 'true').lower() in ['true', 'on', '1']
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'not_found=0.1,activity_check=0.1')  # event_type=fraction kept
+    
+    # Security Event Store
+    SECURITY_EVENT_BATCH_SIZE = int(os.getenv('SECURITY_EVENT_BATCH_SIZE', 500))
+    SECURITY_EVENT_FLUSH_INTERVAL = float(os.getenv('SECURITY_EVENT_FLUSH_INTERVAL', 2))  # seconds
+    SECURITY_EVENT_RETENTION_DAYS = int(os.getenv('SECURITY_EVENT_RETENTION_DAYS', 30))
+    
+    # Brute-force Login Detection (per process, sliding windows)
+    BRUTE_FORCE_WINDOW = int(os.getenv('BRUTE_FORCE_WINDOW', 900))  # seconds
+    BRUTE_FORCE_MAX_PER_PAIR = int(os.getenv('BRUTE_FORCE_MAX_PER_PAIR', 5))  # failures per (IP, email)
+    BRUTE_FORCE_MAX_PER_EMAIL = int(os.getenv('BRUTE_FORCE_MAX_PER_EMAIL', 10))
+    BRUTE_FORCE_MAX_PER_IP = int(os.getenv('BRUTE_FORCE_MAX_PER_IP', 30))
+    BRUTE_FORCE_LOCKOUT = int(os.getenv('BRUTE_FORCE_LOCKOUT', 900))  # seconds
+    BRUTE_FORCE_MAX_KEYS = int(os.getenv('BRUTE_FORCE_MAX_KEYS', 100000))
+    
     # Application Configuration
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'app/static/uploads')
     ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv', 'pdf', 'png', 'jpg', 'jpeg'}
+    
+    # File Storage Configuration
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')  # local or s3
+    STORAGE_ROOT = os.getenv('STORAGE_ROOT', '')  # defaults to instance/files; never under static/
+    S3_BUCKET = os.getenv('S3_BUCKET', '')
+    S3_PREFIX = os.getenv('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', '')  # e.g. http://localhost:9000 for MinIO
+    S3_REGION = os.getenv('S3_REGION', '')
+    S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID', '')
+    S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY', '')
+    
+    # Download Configuration
+    DOWNLOAD_URL_EXPIRES = int(os.getenv('DOWNLOAD_URL_EXPIRES', 3600))  # seconds a signed link stays valid
+    DOWNLOAD_ACCEL = os.getenv('DOWNLOAD_ACCEL', '')  # '', 'nginx' (X-Accel-Redirect) or 'apache' (X-Sendfile)
+    DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '/protected-files/')
+    
+    # QR Code Configuration
+    QR_CACHE_MAX_ENTRIES = int(os.getenv('QR_CACHE_MAX_ENTRIES', 1024))
+    QR_CACHE_MAX_BYTES = int(os.getenv('QR_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    QR_LOGO_CACHE_MAX_ENTRIES = int(os.getenv('QR_LOGO_CACHE_MAX_ENTRIES', 256))
+    QR_LOGO_CACHE_MAX_BYTES = int(os.getenv('QR_LOGO_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    BULK_QR_MAX_ROWS = int(os.getenv('BULK_QR_MAX_ROWS', 10000))
+    BULK_QR_WORKERS = int(os.getenv('BULK_QR_WORKERS', 0))  # encoding processes per web process, 0 = one per CPU
+    BULK_QR_INLINE_ROWS = int(os.getenv('BULK_QR_INLINE_ROWS', 100))  # smaller uploads are encoded without the pool
+    
+    # Document Rendering Configuration
+    RENDER_FONT_REGULAR = os.getenv('RENDER_FONT_REGULAR', '')  # TTF with the ₹ glyph, e.g. DejaVuSans.ttf
+    RENDER_FONT_BOLD = os.getenv('RENDER_FONT_BOLD', '')
+    RENDER_IMAGE_CACHE_SIZE = int(os.getenv('RENDER_IMAGE_CACHE_SIZE', 32))  # decoded logo images kept per process
+    INVOICE_MAX_LINE_ITEMS = int(os.getenv('INVOICE_MAX_LINE_ITEMS', 20000))
+    RENDER_SERVICE = os.getenv('RENDER_SERVICE', 'inprocess')  # 'inprocess' or 'external' (run_render_service.py)
+    RENDER_SERVICE_ADDRESS = os.getenv(  # Unix socket path or host:port
+        'RENDER_SERVICE_ADDRESS',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'render.sock')
+    )
+    RENDER_SERVICE_AUTHKEY = os.getenv('RENDER_SERVICE_AUTHKEY', '')  # required for host:port; Unix sockets may derive it from a non-default SECRET_KEY
+    RENDER_SERVICE_WORKERS = int(os.getenv('RENDER_SERVICE_WORKERS', 0))  # 0 = one per CPU
+    RENDER_SERVICE_MAX_REQUESTS = int(os.getenv('RENDER_SERVICE_MAX_REQUESTS', 1000))  # renders before a worker is recycled, 0 = never
+    RENDER_SERVICE_TIMEOUT = float(os.getenv('RENDER_SERVICE_TIMEOUT', 30))  # seconds, queueing included
+    RENDER_SERVICE_RETRY = float(os.getenv('RENDER_SERVICE_RETRY', 10))  # seconds before retrying an unreachable service
+    RENDER_MAX_CONCURRENCY = int(os.getenv('RENDER_MAX_CONCURRENCY', 2))  # renders running at once per web process
+    RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', 8))  # requests waiting for a render slot
+    RENDER_QUEUE_TIMEOUT = float(os.getenv('RENDER_QUEUE_TIMEOUT', 2))  # seconds a request waits before it is shed
+    RENDER_SHED_MODE = os.getenv('RENDER_SHED_MODE', 'defer')  # 'defer' (202 + polling URL) or 'reject' (503)
+    RENDER_DEFERRED_QUEUE_SIZE = int(os.getenv('RENDER_DEFERRED_QUEUE_SIZE', 32))  # deferred renders per process
+    RENDER_JOB_EXPIRY = int(os.getenv('RENDER_JOB_EXPIRY', 600))  # seconds before an unfinished deferred render is failed
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # bearer token for /admin/metrics scrapers
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Database migration script to add missing columns to user and admin_user tables
+Database migration script to add missing columns to user, admin_user and certificate tables
 """
 from app import create_app, db
 from sqlalchemy import text
@@ -60,6 +60,31 @@ def migrate_database():
                 else:
                     print(f"Error adding created_at to admin_user table: {e}")
 
+            # Add recipient_email column to certificate table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE certificate ADD COLUMN recipient_email VARCHAR(120)"))
+                    conn.commit()
+                print("Added recipient_email column to certificate table")
+            except Exception as e:
+                if "duplicate column name" in str(e):
+                    print("Column recipient_email already exists in certificate table")
+                else:
+                    print(f"Error adding recipient_email to certificate table: {e}")
+
+            # Add updated_at column to template table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE template ADD COLUMN updated_at DATETIME"))
+                    conn.execute(text("UPDATE template SET updated_at = created_at WHERE updated_at IS NULL"))
+                    conn.commit()
+                print("Added updated_at column to template table")
+            except Exception as e:
+                if "duplicate column name" in str(e):
+                    print("Column updated_at already exists in template table")
+                else:
+                    print(f"Error adding updated_at to template table: {e}")
+
             # Update existing records with current timestamp
             try:
                 with db.engine.connect() as conn:
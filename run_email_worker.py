@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Background sender for the email outbox.
+
+Run this when EMAIL_WORKER=external (e.g. several web processes sharing one
+sender). Any number of workers can run against the same database.
+
+    python run_email_worker.py                  # run until interrupted
+    python run_email_worker.py --connections 4  # four SMTP connections in parallel
+    python run_email_worker.py --once           # send one batch and exit
+"""
+import argparse
+from app import create_app, db
+from app.outbox import OutboxWorker, OutboxPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send queued emails')
+    parser.add_argument('--once', action='store_true', help='send one batch and exit')
+    parser.add_argument('--batch-size', type=int, help='messages per batch')
+    parser.add_argument('--connections', type=int, help='parallel SMTP connections (default EMAIL_SMTP_CONNECTIONS)')
+    args = parser.parse_args()
+
+    app = create_app()  # also sets up logging (app/logs.py)
+    with app.app_context():
+        db.create_all()
+
+    if args.once:
+        worker = OutboxWorker(app, batch_size=args.batch_size)
+        print(f"Processed {worker.run_once()} emails")
+        worker.close()
+        return
+    pool = OutboxPool(app, size=args.connections, batch_size=args.batch_size).start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
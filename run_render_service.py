@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Warm render service for invoices, resumes and certificates.
+
+Run this when RENDER_SERVICE=external. It loads ReportLab, fonts and the
+compiled templates once and forks the render workers, which listen on
+RENDER_SERVICE_ADDRESS; web processes on the same host (or, with a
+host:port address, the same network) send their renders here.
+
+    python run_render_service.py               # RENDER_SERVICE_WORKERS workers
+    python run_render_service.py --workers 4
+"""
+import argparse
+import sys
+from app import create_app
+from app.render_service import RenderServer, RenderServiceConfigError, service_authkey
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve PDF renders for the web workers')
+    parser.add_argument('--workers', type=int, help='render processes (default RENDER_SERVICE_WORKERS, 0 = one per CPU)')
+    parser.add_argument('--address', help='socket path or host:port (default RENDER_SERVICE_ADDRESS)')
+    args = parser.parse_args()
+
+    app = create_app()  # registers fonts and compiles the built-in templates (app/render_resources.py)
+    config = app.config
+    address = args.address or config['RENDER_SERVICE_ADDRESS']
+    try:
+        authkey = service_authkey(config, address)
+    except RenderServiceConfigError as e:
+        sys.exit(f"Refusing to start the render service: {e}")
+    server = RenderServer(
+        address,
+        authkey,
+        workers=args.workers or config.get('RENDER_SERVICE_WORKERS'),
+        max_requests=config.get('RENDER_SERVICE_MAX_REQUESTS', 0)
+    ).start()
+    print(f"Render service listening on {address} with {server.workers} workers")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
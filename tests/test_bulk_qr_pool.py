@@ -0,0 +1,18 @@
+from flask import Flask
+
+from app.bulk_certificates import encode_qr_batch
+from app.qr_engine import encode_job, make_spec
+
+
+def test_large_batches_are_encoded_in_a_forkserver_pool():
+    app = Flask(__name__)
+    app.config.update(BULK_QR_WORKERS=2, BULK_QR_INLINE_ROWS=2)
+    jobs = [(make_spec(f'https://x.com/?t={i}'), 'svg') for i in range(5)]
+    with app.app_context():
+        encoded = encode_qr_batch(jobs)
+        pool = app.extensions['bulk_qr_pool']
+        assert encode_qr_batch(jobs) == encoded
+        assert app.extensions['bulk_qr_pool'] is pool
+    assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+    assert encoded == [encode_job(job) for job in jobs]
+    pool.shutdown()
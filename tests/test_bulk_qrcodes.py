@@ -0,0 +1,27 @@
+import io
+
+from werkzeug.datastructures import FileStorage
+
+from app.bulk_certificates import parse_qr_csv
+
+
+def upload(content):
+    return FileStorage(stream=io.BytesIO(content), filename='codes.csv')
+
+
+def test_parse_qr_csv_reads_quoted_payloads():
+    rows, error = parse_qr_csv(upload(b'data,filename\n"https://x.com/?a=1,2",ticket\n'), 10)
+    assert error is None
+    assert rows == [{'data': 'https://x.com/?a=1,2', 'filename': 'ticket'}]
+
+
+def test_parse_qr_csv_rejects_unquoted_commas():
+    rows, error = parse_qr_csv(upload(b'data\nhttps://x.com/?a=1\nhttps://x.com/?a=1,2\n'), 10)
+    assert rows is None
+    assert error == 'Row 3: quote values that contain commas'
+
+
+def test_parse_qr_csv_rejects_non_utf8():
+    rows, error = parse_qr_csv(upload('data\ncafé\n'.encode('latin-1')), 10)
+    assert rows is None
+    assert 'UTF-8' in error
@@ -0,0 +1,22 @@
+from decimal import Decimal
+
+from app.invoice_items import LineItem, items_total, parse_text_items
+
+
+def test_parse_text_items_keeps_negative_amounts():
+    items = parse_text_items('Design - 5000\nDiscount - -500\nRefund--1,000.50')
+    assert items == [
+        LineItem('Design', Decimal('5000')),
+        LineItem('Discount', Decimal('-500')),
+        LineItem('Refund', Decimal('-1000.50')),
+    ]
+    assert items_total(items) == Decimal('3499.50')
+
+
+def test_parse_text_items_keeps_hyphens_in_descriptions():
+    items = parse_text_items('Front-end work - 12,000\nSet-up fee - Rs. 300\nWell-known service')
+    assert items == [
+        LineItem('Front-end work', Decimal('12000')),
+        LineItem('Set-up fee', Decimal('300')),
+        LineItem('Well-known service', None),
+    ]
@@ -0,0 +1,26 @@
+from types import MappingProxyType
+from unittest import mock
+
+from reportlab.lib import colors
+
+from app import rendering
+from app.render_service import _handle
+from app.template_registry import TemplateInfo
+
+
+def template(primary):
+    return TemplateInfo(5, 'Brand', 'certificate', False,
+                        MappingProxyType({'colors': {'primary': primary}}), None)
+
+
+def test_service_compiles_templates_by_content():
+    # Two web processes can send the same template id at the same registry version
+    payload = {'recipient_name': 'R', 'course_title': 'C', 'issuer': 'I', 'date_issued': 'd',
+               'signature_name': 'S', 'signature_title': 'T'}
+    used = []
+    renderer = mock.Mock(side_effect=lambda payload, compiled: used.append(compiled) or b'%PDF')
+    with mock.patch.dict(rendering.RENDERERS, {'certificate': renderer}):
+        _handle(('render', 'certificate', payload, template('#ff0000')))
+        _handle(('render', 'certificate', payload, template('#0000ff')))
+    assert used[0].palette['primary'] == colors.HexColor('#ff0000')
+    assert used[1].palette['primary'] == colors.HexColor('#0000ff')
@@ -0,0 +1,30 @@
+import os
+import stat
+
+import pytest
+
+from app.render_service import RenderServer, RenderServiceConfigError, service_authkey
+
+
+def test_tcp_address_requires_an_explicit_authkey():
+    config = {'SECRET_KEY': 'not-the-default', 'RENDER_SERVICE_ADDRESS': '0.0.0.0:7010'}
+    with pytest.raises(RenderServiceConfigError):
+        service_authkey(config)
+    assert service_authkey(dict(config, RENDER_SERVICE_AUTHKEY='k')) == b'k'
+
+
+def test_default_secret_key_is_never_used_as_the_authkey(tmp_path):
+    address = str(tmp_path / 'render.sock')
+    with pytest.raises(RenderServiceConfigError):
+        service_authkey({'SECRET_KEY': 'defaultsecret'}, address)
+    assert service_authkey({'SECRET_KEY': 'not-the-default'}, address)
+
+
+def test_unix_socket_is_owner_only(tmp_path):
+    address = str(tmp_path / 'render.sock')
+    server = RenderServer(address, b'k', workers=1)
+    server.start()
+    try:
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    finally:
+        server.stop()
@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+from app.invoice_items import LineItem
+from app.rendering import LineItemsTable, compile_template
+
+
+def test_line_item_descriptions_use_the_template_font():
+    compiled = compile_template('invoice', {'style': 'professional'}, 1)
+    normal = compiled.styles['normal']
+    items = [LineItem('Design', Decimal('5000')), LineItem('Discount', Decimal('-500'))]
+    table = LineItemsTable(items, [300, 150], compiled)._page_table(len(items))
+    for row in (1, 2):
+        cell = table._cellStyles[row][0]
+        assert isinstance(table._cellvalues[row][0], str)
+        assert (cell.fontname, cell.fontsize) == (normal.fontName, normal.fontSize)
+    assert normal.fontName == 'Times-Roman'
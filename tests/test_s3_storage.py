@@ -0,0 +1,66 @@
+import hashlib
+import io
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto_server = pytest.importorskip('moto.server')
+
+from app.storage import S3Storage, create_storage  # noqa: E402
+
+
+@pytest.fixture
+def s3_endpoint():
+    # A local S3 API stand-in, reached through S3_ENDPOINT_URL like MinIO
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f'http://{host}:{port}'
+    boto3.client('s3', endpoint_url=endpoint, region_name='us-east-1',
+                 aws_access_key_id='test', aws_secret_access_key='test').create_bucket(Bucket='documents')
+    yield endpoint
+    server.stop()
+
+
+@pytest.fixture
+def storage(s3_endpoint):
+    storage = create_storage({
+        'STORAGE_BACKEND': 's3',
+        'S3_BUCKET': 'documents',
+        'S3_PREFIX': 'app',
+        'S3_ENDPOINT_URL': s3_endpoint,
+        'S3_REGION': 'us-east-1',
+        'S3_ACCESS_KEY_ID': 'test',
+        'S3_SECRET_ACCESS_KEY': 'test',
+    }, '/unused')
+    assert isinstance(storage, S3Storage)
+    return storage
+
+
+def test_save_open_and_delete(storage):
+    data = b'%PDF-1.4 invoice'
+    stored = storage.save(data, 'invoices', 'pdf')
+    digest = hashlib.sha256(data).hexdigest()
+    assert stored.key == f'invoices/{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+    assert stored.size == len(data)
+    assert storage.exists(stored.key)
+
+    head = storage.client.head_object(Bucket='documents', Key=f'app/{stored.key}')
+    assert head['ContentType'] == 'application/pdf'
+    with storage.open(stored.key) as body:
+        assert body.read() == data
+
+    assert storage.save(data, 'invoices', 'pdf') == stored  # content addressed
+    assert storage.delete(stored.key)
+    assert not storage.exists(stored.key)
+
+
+def test_save_stream(storage):
+    data = b'\x89PNG' + b'x' * (256 * 1024)
+    stored = storage.save_stream(io.BytesIO(data), 'qrcodes', 'png')
+    assert stored.key.endswith(hashlib.sha256(data).hexdigest() + '.png')
+    assert stored.size == len(data)
+    with storage.open(stored.key) as body:
+        assert body.read() == data
+    storage.delete(stored.key)
+    assert not storage.exists(stored.key)
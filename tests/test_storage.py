@@ -0,0 +1,17 @@
+import os
+
+from app.storage import LocalStorage, create_storage
+
+
+def test_local_storage_defaults_to_the_instance_folder(tmp_path):
+    storage = create_storage({}, str(tmp_path))
+    assert isinstance(storage, LocalStorage)
+    assert storage.root == os.path.join(str(tmp_path), 'files')
+
+    stored = storage.save(b'%PDF-1.4', 'invoices', 'pdf')
+    assert os.path.exists(os.path.join(str(tmp_path), 'files', *stored.key.split('/')))
+
+
+def test_local_storage_root_can_be_configured(tmp_path):
+    storage = create_storage({'STORAGE_ROOT': str(tmp_path / 'data')}, '/unused')
+    assert storage.root == str(tmp_path / 'data')
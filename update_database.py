@@ -5,7 +5,8 @@ Run this script to add the new Resume, Certificate, and AdminUser tables.
 """
 
 from app import create_app, db
-from app.models import User, Invoice, QRCode, Resume, Certificate, Subscription, AdminUser
+from app.models import User, Invoice, QRCode, Resume, Certificate, Subscription, AdminUser, DocumentIndex, EmailOutbox, SecurityEvent, PlanDefinition, RenderJob
+from app.documents import backfill_document_index
 
 def update_database():
     app = create_app()
@@ -19,6 +20,14 @@ def update_database():
             print("- Resume")
             print("- Certificate") 
             print("- AdminUser")
+            print("- DocumentIndex")
+            print("- EmailOutbox")
+            print("- SecurityEvent")
+            print("- PlanDefinition")
+            print("- RenderJob")
+
+            indexed = backfill_document_index()
+            print(f"Indexed {indexed} existing files for the admin file browser")
             print("\nYou can now run the application with the new admin panel.")
         except Exception as e:
             print(f"❌ Error updating database: {e}")
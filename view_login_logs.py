@@ -1,14 +1,221 @@
 #!/usr/bin/env python3
 """
 Script to view login activity logs
+
+login_activity.log is append-only and ordered by time (JSON lines written
+by app/logs.py; older "2025-09-14 06:42:34,567 - ..." lines are still
+understood). Instead of reading the whole file, the reader binary-searches
+byte offsets for the first entry of the requested window and only reads
+from there, so "last N hours" costs time proportional to the entries in
+that window, not to the size of the file.
+
+An optional sidecar index (<log file>.idx, one "offset timestamp" line
+per INDEX_STEP bytes) narrows the search to a single step before the
+first seek. It is built with --index and extended on later runs; it is
+rebuilt automatically if the log was rotated or truncated.
+
+Usage:
+    python view_login_logs.py [hours|all|clear] [--user NAME|ID] [--email ADDR]
+                              [--ip ADDR] [--follow] [--index] [--file PATH]
 """
+import argparse
+import bisect
+import json
 import os
-from datetime import datetime, timedelta
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 
-def view_login_logs(hours=24):
-    """View login logs from the last X hours"""
-    log_file = 'login_activity.log'
+LOG_FILE = 'login_activity.log'
+INDEX_STEP = 1024 * 1024  # bytes of log per sidecar index entry
+# Several processes append to the same file, so entries can be slightly
+# out of order; start reading this much before the requested time
+ORDER_SLACK = timedelta(seconds=60)
+
+
+def parse_timestamp(line):
+    """Timestamp of a log line as an aware UTC datetime, or None"""
+    if line.startswith('{"ts": "'):
+        # JSON line: the timestamp is always the first key, no need to parse it all
+        end = line.find('"', 8)
+        try:
+            return datetime.fromisoformat(line[8:end])
+        except ValueError:
+            return None
+    try:
+        # Legacy format: 2025-09-14 06:42:34,567 - Login: ... (local time)
+        local = datetime.strptime(line.split(' - ', 1)[0], '%Y-%m-%d %H:%M:%S,%f')
+        return local.astimezone(timezone.utc)
+    except (ValueError, IndexError):
+        return None
+
+
+def _timestamp_at(f, offset, end):
+    """
+    (line_start, timestamp) of the first complete, timestamped line at or
+    after ``offset``; (end, None) if there is none before ``end``.
+    """
+    f.seek(offset)
+    if offset:
+        f.readline()  # skip the partial line we landed in
+    while True:
+        position = f.tell()
+        if position >= end:
+            return end, None
+        raw = f.readline()
+        if not raw:
+            return end, None
+        ts = parse_timestamp(raw.decode('utf-8', 'replace'))
+        if ts is not None:
+            return position, ts
+
+
+def find_offset(f, target, lo=0, hi=None):
+    """
+    Byte offset of the first line with a timestamp >= target, by binary
+    search over [lo, hi). O(log n) seeks, each reading about one line.
+    """
+    if hi is None:
+        f.seek(0, os.SEEK_END)
+        hi = f.tell()
+    while hi - lo > 4096:
+        mid = (lo + hi) // 2
+        position, ts = _timestamp_at(f, mid, hi)
+        if ts is None or ts >= target:
+            hi = mid
+        else:
+            lo = position
+    # Finish with a short linear scan (lo is always the start of a line)
+    f.seek(lo)
+    while True:
+        position = f.tell()
+        raw = f.readline()
+        if not raw:
+            return position
+        ts = parse_timestamp(raw.decode('utf-8', 'replace'))
+        if ts is not None and ts >= target:
+            return position
+
+
+# Sidecar index
+
+def _index_path(log_file):
+    return log_file + '.idx'
+
+
+def _file_id(log_file):
+    stat = os.stat(log_file)
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+def load_index(log_file):
+    """Return (offsets, timestamps) from the sidecar index, or None if missing/stale"""
+    path = _index_path(log_file)
+    if not os.path.exists(path):
+        return None
+    offsets, stamps = [], []
+    with open(path, 'r') as f:
+        if f.readline().strip() != f"v1 {_file_id(log_file)}":
+            return None
+        for line in f:
+            offset, ts = line.split(' ', 1)
+            offsets.append(int(offset))
+            stamps.append(datetime.fromisoformat(ts.strip()))
+    if offsets and offsets[-1] > os.path.getsize(log_file):
+        return None  # truncated since the index was built
+    return offsets, stamps
+
+
+def build_index(log_file):
+    """Create or extend the sidecar index; only the unindexed tail is read"""
+    existing = load_index(log_file)
+    offsets, stamps = existing if existing else ([], [])
+    start = offsets[-1] + INDEX_STEP if offsets else 0
+    size = os.path.getsize(log_file)
+    added = 0
+    with open(log_file, 'rb') as f:
+        while start < size:
+            position, ts = _timestamp_at(f, start, size)
+            if ts is None:
+                break
+            offsets.append(position)
+            stamps.append(ts)
+            added += 1
+            start = position + INDEX_STEP
+    with open(_index_path(log_file) + '.tmp', 'w') as f:
+        f.write(f"v1 {_file_id(log_file)}\n")
+        for offset, ts in zip(offsets, stamps):
+            f.write(f"{offset} {ts.isoformat()}\n")
+    os.replace(_index_path(log_file) + '.tmp', _index_path(log_file))
+    return added
+
+
+def _search_bounds(log_file, target):
+    """Narrow the binary search range using the sidecar index, if present"""
+    index = load_index(log_file)
+    if not index:
+        return 0, None
+    offsets, stamps = index
+    i = bisect.bisect_left(stamps, target)
+    lo = offsets[i - 1] if i > 0 else 0
+    hi = offsets[i] + 1 if i < len(offsets) else None
+    return lo, hi
+
+
+# Reading and filtering
+
+def make_filter(user=None, email=None, ip=None):
+    """Predicate over (raw line, parsed JSON or None)"""
+    def matches(line, entry):
+        if entry is None:
+            # Legacy text line: fall back to substring matching
+            return all(value in line for value in (user, email, ip) if value)
+        if user and user not in (str(entry.get('user_id')), entry.get('username')):
+            return False
+        if email and (entry.get('email') or '').lower() != email.lower():
+            return False
+        if ip and entry.get('ip_address') != ip:
+            return False
+        return True
+    return matches
 
+
+def iter_entries(f, since=None, matches=None, complete_only=False):
+    """
+    Yield (timestamp, line, entry) from the current position of ``f``.
+    With ``complete_only`` a trailing line still being written is left
+    for the next call.
+    """
+    for raw in f:
+        if complete_only and not raw.endswith(b'\n'):
+            f.seek(-len(raw), os.SEEK_CUR)
+            return
+        line = raw.decode('utf-8', 'replace').rstrip('\n')
+        if not line.strip():
+            continue
+        ts = parse_timestamp(line)
+        if since and ts is not None and ts < since:
+            continue
+        entry = None
+        if line.startswith('{'):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                pass
+        if matches and not matches(line, entry):
+            continue
+        yield ts, line, entry
+
+
+def format_entry(ts, line, entry):
+    if entry is None:
+        return line
+    stamp = ts.astimezone().strftime('%Y-%m-%d %H:%M:%S') if ts else entry.get('ts')
+    return f"{stamp} - {entry.get('msg')}"
+
+
+def view_login_logs(hours=24, log_file=LOG_FILE, matches=None, follow=False):
+    """View login logs from the last X hours"""
     if not os.path.exists(log_file):
         print(f"Log file '{log_file}' does not exist yet.")
         print("Login activity will be logged here when users log in/out.")
@@ -18,38 +225,26 @@ def view_login_logs(hours=24):
     print(f"Log file: {os.path.abspath(log_file)}")
     print("-" * 60)
 
-    threshold = datetime.now() - timedelta(hours=hours)
-
-    with open(log_file, 'r') as f:
-        lines = f.readlines()
-
-    recent_logs = []
-    for line in lines:
-        if line.strip():
-            # Parse the timestamp from the log line
-            try:
-                # Log format: 2025-09-14 06:42:34,567 - Login: User username (email) - IP: 127.0.0.1
-                timestamp_str = line.split(' - ')[0]
-                log_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-
-                if log_time >= threshold:
-                    recent_logs.append(line.strip())
-            except (ValueError, IndexError):
-                # If we can't parse the timestamp, include the line anyway
-                recent_logs.append(line.strip())
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    count = 0
+    with open(log_file, 'rb') as f:
+        lo, hi = _search_bounds(log_file, since - ORDER_SLACK)
+        f.seek(find_offset(f, since - ORDER_SLACK, lo, hi))
+        for entry in iter_entries(f, since, matches):
+            print(format_entry(*entry))
+            count += 1
 
-    if not recent_logs:
+    if not count:
         print(f"No login activity in the last {hours} hours.")
     else:
-        for log in recent_logs:
-            print(log)
+        print(f"\n{count} entries")
 
-    print(f"\nTotal log entries in file: {len(lines)}")
+    if follow:
+        follow_logs(log_file, matches)
 
-def view_all_logs():
-    """View all login logs"""
-    log_file = 'login_activity.log'
 
+def view_all_logs(log_file=LOG_FILE, matches=None, follow=False):
+    """View all login logs"""
     if not os.path.exists(log_file):
         print(f"Log file '{log_file}' does not exist yet.")
         return
@@ -58,40 +253,77 @@ def view_all_logs():
     print(f"Log file: {os.path.abspath(log_file)}")
     print("-" * 60)
 
-    with open(log_file, 'r') as f:
-        content = f.read()
+    with open(log_file, 'rb') as f:
+        for entry in iter_entries(f, matches=matches):
+            print(format_entry(*entry))
 
-    if content.strip():
-        print(content)
-    else:
-        print("Log file is empty.")
+    if follow:
+        follow_logs(log_file, matches)
+
+
+def follow_logs(log_file=LOG_FILE, matches=None, interval=0.5):
+    """Print new entries as they are written (like tail -f), across rotations"""
+    print("-- following, Ctrl+C to stop --")
+    f = open(log_file, 'rb')
+    f.seek(0, os.SEEK_END)
+    file_id = _file_id(log_file)
+    try:
+        while True:
+            for entry in iter_entries(f, matches=matches, complete_only=True):
+                print(format_entry(*entry), flush=True)
+            time.sleep(interval)
+            try:
+                rotated = _file_id(log_file) != file_id or os.path.getsize(log_file) < f.tell()
+            except FileNotFoundError:
+                continue  # between rotation and the next write
+            if rotated:
+                f.close()
+                f = open(log_file, 'rb')
+                file_id = _file_id(log_file)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        f.close()
 
-def clear_logs():
-    """Clear the login log file"""
-    log_file = 'login_activity.log'
 
+def clear_logs(log_file=LOG_FILE):
+    """Clear the login log file"""
     if os.path.exists(log_file):
         with open(log_file, 'w') as f:
             f.write("")
+        if os.path.exists(_index_path(log_file)):
+            os.remove(_index_path(log_file))
         print(f"Login logs cleared. File: {os.path.abspath(log_file)}")
     else:
         print("Log file does not exist.")
 
+
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
-        if command == 'all':
-            view_all_logs()
-        elif command == 'clear':
-            clear_logs()
-        elif command.isdigit():
-            view_login_logs(int(command))
-        else:
-            print("Usage: python view_login_logs.py [hours|all|clear]")
-            print("  hours: Show logs from last X hours (default: 24)")
-            print("  all: Show all logs")
-            print("  clear: Clear all logs")
+    parser = argparse.ArgumentParser(description='View login activity logs')
+    parser.add_argument('command', nargs='?', default='24',
+                        help="hours to show (default 24), 'all' or 'clear'")
+    parser.add_argument('--user', help='username or user id')
+    parser.add_argument('--email', help='email address')
+    parser.add_argument('--ip', help='client IP address')
+    parser.add_argument('-f', '--follow', action='store_true', help='keep printing new entries')
+    parser.add_argument('--index', action='store_true', help='build/extend the sidecar offset index first')
+    parser.add_argument('--file', default=LOG_FILE, help=f'log file (default {LOG_FILE})')
+    args = parser.parse_args()
+
+    matches = make_filter(args.user, args.email, args.ip) if (args.user or args.email or args.ip) else None
+
+    if args.index and os.path.exists(args.file):
+        print(f"Indexed {build_index(args.file)} new positions in {_index_path(args.file)}")
+
+    if args.command == 'all':
+        view_all_logs(args.file, matches, args.follow)
+    elif args.command == 'clear':
+        clear_logs(args.file)
+    elif args.command.isdigit():
+        view_login_logs(int(args.command), args.file, matches, args.follow)
     else:
-        view_login_logs(24)
\ No newline at end of file
+        parser.print_usage()
+        print("  hours: Show logs from last X hours (default: 24)")
+        print("  all: Show all logs")
+        print("  clear: Clear all logs")
+        sys.exit(1)